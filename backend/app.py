@@ -1,36 +1,85 @@
+import logging
 from os import getenv
 from dotenv import load_dotenv
 load_dotenv()
 
-from flask import Flask, Blueprint
+from flask import Flask, Blueprint, jsonify
 from flask_cors import CORS
 from prometheus_flask_exporter import PrometheusMetrics
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
 from src.routes.user_routes import router_user
 from src.routes.trasaction_routes import router_transaction
 from src.routes.card_roules import card_routes  
 from src.routes.email_routes import email_routes
 from src.routes.form_routes import form_routes
 from src.routes.posso_ajudar import posso_ajudar_routes
+from src.routes.debug_routes import debug_routes
+from src.cache.catalog_cache import catalogo
+from src.database.db import BancoIndisponivel
+from src.response.json_response import OrjsonProvider
+from src.response.compression import response_middleware
+from src.database.instrumentation import request_db_metrics
+from src.log.structured_log import configurar_logging, request_id_middleware
+
+log = logging.getLogger(__name__)
 
 rout_teste = Blueprint('route', __name__)
 @rout_teste.route('/', methods=['GET'])
 def teste():
     return "Hello World"
 
-app = Flask(__name__)
+def create_app():
+    """
+    Cria o app Flask. Em produção o gunicorn chama esta função em cada worker,
+    depois do fork, então pool de conexões, caches e filas são de cada processo.
+    """
+    configurar_logging()  # fila e thread de escrita de log deste worker
+
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)  # jsonify e get_json com o mesmo serializador das rotas
+
+    # Inicializar métricas do Prometheus (agregadas entre workers quando há PROMETHEUS_MULTIPROC_DIR)
+    if getenv("PROMETHEUS_MULTIPROC_DIR"):
+        GunicornInternalPrometheusMetrics(app)
+    else:
+        PrometheusMetrics(app)
+
+    app.register_blueprint(rout_teste)
+    app.register_blueprint(router_user)
+    app.register_blueprint(router_transaction)
+    app.register_blueprint(card_routes)
+    app.register_blueprint(email_routes)
+    app.register_blueprint(form_routes)
+    app.register_blueprint(posso_ajudar_routes)
+
+    # Pool esgotado ou banco fora do ar: 503 para o cliente tentar de novo, em vez de 500
+    @app.errorhandler(BancoIndisponivel)
+    def banco_indisponivel(e):
+        return jsonify({"error": "Banco de dados indisponível, tente novamente"}), 503, {'Retry-After': '1'}
+
+    # Rotas de diagnóstico (ex.: /debug/slow_queries) só quando habilitadas
+    if getenv("DEBUG_ENDPOINTS", "false").lower() == "true":
+        app.register_blueprint(debug_routes)
+
+    # Preflight fica em cache no navegador por CORS_MAX_AGE segundos
+    CORS(app, max_age=int(getenv("CORS_MAX_AGE", "86400")))
+
+    # ETag/304 e compressão gzip/brotli das respostas
+    response_middleware.init_app(app)
+
+    # Tempo em banco e quantidade de comandos SQL por requisição
+    request_db_metrics.init_app(app)
 
-# Inicializar métricas do Prometheus
-metrics = PrometheusMetrics(app)
+    # Id de correlação (X-Request-ID) anexado aos logs de cada requisição
+    request_id_middleware.init_app(app)
 
-app.register_blueprint(rout_teste)
-app.register_blueprint(router_user)
-app.register_blueprint(router_transaction)
-app.register_blueprint(card_routes)
-app.register_blueprint(email_routes)
-app.register_blueprint(form_routes)
-app.register_blueprint(posso_ajudar_routes)
+    # Carrega o catálogo do posso_ajudar na subida; se o banco não estiver pronto, carrega no primeiro acesso
+    try:
+        catalogo.recarregar()
+    except Exception as e:
+        log.warning("Catálogo não carregado na subida, será carregado no primeiro acesso: %s", e)
 
-CORS(app)
+    return app
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
+    create_app().run(host='0.0.0.0', port=5000)
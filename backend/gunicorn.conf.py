@@ -0,0 +1,61 @@
+"""
+Configuração do gunicorn para produção: `gunicorn -c gunicorn.conf.py "app:create_app()"`.
+
+O número de workers acompanha a cota de CPU do container (cgroup), não a
+quantidade de CPUs do nó, e cada worker atende várias requisições com threads.
+"""
+import math
+import os
+import shutil
+
+from prometheus_flask_exporter.multiprocess import GunicornInternalPrometheusMetrics
+
+
+def cpus_disponiveis():
+    """
+    CPUs permitidas pelo cgroup (v2 ou v1), arredondadas para cima; sem
+    limite configurado, usa as CPUs visíveis para o processo.
+    """
+    try:
+        with open('/sys/fs/cgroup/cpu.max') as arquivo:
+            cota, periodo = arquivo.read().split()
+        if cota != 'max':
+            return max(1, math.ceil(int(cota) / int(periodo)))
+    except (OSError, ValueError):
+        try:
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as arquivo:
+                cota = int(arquivo.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as arquivo:
+                periodo = int(arquivo.read())
+            if cota > 0:
+                return max(1, math.ceil(cota / periodo))
+        except (OSError, ValueError):
+            pass
+    return len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else (os.cpu_count() or 1)
+
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', cpus_disponiveis() * int(os.getenv('WORKERS_PER_CPU', '1'))))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+worker_class = 'gthread'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+keepalive = 5
+
+# O app é criado em cada worker depois do fork (pool, caches e filas não são compartilhados)
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Métricas de execuções anteriores não podem ser somadas às novas
+    diretorio = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if diretorio:
+        shutil.rmtree(diretorio, ignore_errors=True)
+        os.makedirs(diretorio, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        GunicornInternalPrometheusMetrics.mark_process_dead_on_child_exit(worker.pid)
@@ -0,0 +1,95 @@
+"""
+Micro-benchmark da serialização da listagem de transações.
+
+Compara, por linha, o caminho antigo (format_transaction com strftime e
+float(Decimal) + json.dumps) com o atual (linhas já formatadas pelo SQL,
+dict(zip(...)) + orjson). Não precisa de banco: as linhas são sintéticas,
+nos mesmos tipos que o psycopg2 devolve em cada caso.
+
+Também compara o tamanho e o tempo de parse da resposta em objetos com a
+do formato colunar (?format=columnar), com e sem gzip.
+
+Uso (a partir de backend/):
+    python -m scripts.benchmark_json [--linhas 10000] [--repeticoes 20]
+"""
+import argparse
+import json
+import random
+import timeit
+import zlib
+from datetime import date, timedelta
+from decimal import Decimal
+
+from src.database.transaction_database import TransactionDatabase
+from src.response.json_response import dumps
+
+
+CATEGORIAS = ['Alimentação', 'Transporte', 'Saúde', 'Lazer', 'Educação', 'Moradia']
+
+
+def format_transaction_antigo(transaction_tuple):
+    return {
+        "idTransaction": transaction_tuple[0],
+        "idUser": transaction_tuple[1],
+        "estabelecimento": transaction_tuple[2],
+        "categoria": transaction_tuple[3],
+        "valor": float(transaction_tuple[4]),
+        "data": transaction_tuple[5].strftime("%d/%m/%Y")
+    }
+
+
+def gerar_linhas(quantidade):
+    """
+    Gera as mesmas transações nos dois formatos: (Decimal, date) como no
+    SELECT * antigo e (float, 'DD/MM/YYYY') como no SELECT atual.
+    """
+    aleatorio = random.Random(42)
+    inicio = date(2024, 1, 1)
+    antigas, atuais = [], []
+    for id in range(1, quantidade + 1):
+        valor = Decimal(aleatorio.randint(100, 500000)) / 100
+        data = inicio + timedelta(days=aleatorio.randint(0, 365))
+        base = (id, 1, f'Estabelecimento {id % 300}', aleatorio.choice(CATEGORIAS))
+        antigas.append(base + (valor, data))
+        atuais.append(base + (float(valor), data.strftime("%d/%m/%Y")))
+    return antigas, atuais
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=10000, help='quantidade de transações')
+    parser.add_argument('--repeticoes', type=int, default=20, help='execuções de cada caminho (vale a melhor)')
+    args = parser.parse_args()
+
+    antigas, atuais = gerar_linhas(args.linhas)
+
+    def antes():
+        return json.dumps([format_transaction_antigo(row) for row in antigas]).encode('utf-8')
+
+    def depois():
+        return dumps([TransactionDatabase.format_transaction(row) for row in atuais])
+
+    if json.loads(antes()) != json.loads(depois()):
+        raise SystemExit("Os dois caminhos geraram respostas diferentes")
+
+    print(f"{args.linhas} linhas, melhor de {args.repeticoes} execuções")
+    resultados = {}
+    for nome, funcao in (('antes', antes), ('depois', depois)):
+        melhor = min(timeit.repeat(funcao, number=1, repeat=args.repeticoes))
+        resultados[nome] = melhor
+        print(f"  {nome:<7} {melhor * 1000:8.2f} ms total  {melhor / args.linhas * 1e6:6.2f} µs/linha")
+    print(f"  ganho   {resultados['antes'] / resultados['depois']:8.1f}x")
+
+    objetos = depois()
+    colunar = dumps(TransactionDatabase.format_columnar(atuais))
+    print("Resposta em objetos x colunar")
+    for nome, corpo in (('objetos', objetos), ('colunar', colunar)):
+        parse = min(timeit.repeat(lambda: json.loads(corpo), number=1, repeat=args.repeticoes))
+        print(
+            f"  {nome:<8} {len(corpo) / 1024:8.1f} KiB  {len(zlib.compress(corpo, 6)) / 1024:7.1f} KiB gzip"
+            f"  parse {parse * 1000:6.2f} ms"
+        )
+
+
+if __name__ == '__main__':
+    main()
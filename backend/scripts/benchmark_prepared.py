@@ -0,0 +1,146 @@
+"""
+Benchmark dos comandos preparados (PREPARE/EXECUTE) nas consultas mais usadas.
+
+Cria o mesmo schema temporário do verificar_planos, populado com uma massa
+sintética, e para cada consulta compara o envio do SQL em texto com o
+comando preparado de src.database.db:
+
+  - tempo de planejamento no servidor (Planning Time do EXPLAIN ANALYZE),
+    que com o plano genérico do comando preparado cai para quase zero;
+  - tempo total por chamada visto pelo cliente.
+
+Uso (a partir de backend/):
+    python -m scripts.benchmark_prepared [--usuarios 2000] [--transacoes 200] [--chamadas 500]
+"""
+import argparse
+import os
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+
+from src.database import db
+from src.database.transaction_database import TransactionDatabase
+from src.database.user_database import UserDatabase
+from scripts.verificar_planos import SCHEMA, preparar_schema
+
+
+def consultas(idUser):
+    mes = date.today().strftime('%Y-%m')
+    pagina, params_pagina = TransactionDatabase.filtros_transacoes(idUser)
+    filtro_mes, params_mes = TransactionDatabase.filtros_transacoes(idUser, mes)
+    return [
+        (
+            'cartoes por usuario',
+            "SELECT idCartao, idUser, numero, nome, meta::float8, tipo FROM cartao WHERE idUser = %s",
+            (idUser,),
+        ),
+        (
+            'usuario por id',
+            f"SELECT {UserDatabase.COLUNAS_USUARIO} FROM users WHERE idUser = %s",
+            (idUser,),
+        ),
+        (
+            'usuario por email (login)',
+            f"SELECT {UserDatabase.COLUNAS_USUARIO} FROM users WHERE email = %s",
+            (f'sintetico{idUser}@patocash.local',),
+        ),
+        (
+            'transacoes (pagina)',
+            pagina + " ORDER BY data DESC, idTransaction DESC LIMIT %s",
+            tuple(params_pagina) + (51,),
+        ),
+        (
+            'transacoes (mes)',
+            filtro_mes + " ORDER BY data DESC, idTransaction DESC",
+            tuple(params_mes),
+        ),
+    ]
+
+
+def tempo_planejamento(cursor, comando, params, repeticoes):
+    """
+    Média do Planning Time (ms) informado pelo servidor para `comando`.
+    """
+    total = 0.0
+    for _ in range(repeticoes):
+        cursor.execute('EXPLAIN (ANALYZE, SUMMARY, FORMAT JSON) ' + comando, params)
+        total += cursor.fetchone()[0][0]['Planning Time']
+    return total / repeticoes
+
+
+def tempo_por_chamada(executar, chamadas):
+    inicio = time.perf_counter()
+    for _ in range(chamadas):
+        executar()
+    return (time.perf_counter() - inicio) / chamadas * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=2000)
+    parser.add_argument('--transacoes', type=int, default=200, help='transações por usuário')
+    parser.add_argument('--chamadas', type=int, default=500, help='execuções de cada consulta')
+    args = parser.parse_args()
+
+    setup = preparar_schema(args.usuarios, args.transacoes)
+    with setup.cursor() as cursor:
+        cursor.execute(
+            '''
+                INSERT INTO cartao (idUser, numero, nome, meta, tipo)
+                SELECT u, '0000 0000 0000 ' || lpad(c::text, 4, '0'), 'Cartão ' || c, 1000, 'credito'
+                FROM generate_series(1, %s) u, generate_series(1, 3) c
+            ''',
+            (args.usuarios,)
+        )
+        cursor.execute('ANALYZE cartao')
+    setup.commit()
+
+    conn = psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=os.getenv("POSTGRES_PORT"),
+        options=f'-c search_path={SCHEMA},public',
+        connection_factory=db.PreparedConnection,
+    )
+    conn.autocommit = True
+
+    try:
+        print(f"{args.chamadas} chamadas por consulta (ms)")
+        print(f"  {'consulta':<28} {'plan texto':>10} {'plan prep':>10} {'texto':>8} {'prep':>8}")
+        for nome, sql, params in consultas(args.usuarios // 2):
+            statement = db.prepared(sql)
+            with conn.cursor() as cursor:
+                def texto():
+                    cursor.execute(sql, params)
+                    cursor.fetchall()
+
+                def preparado():
+                    statement.execute(cursor, params)
+                    cursor.fetchall()
+
+                # Aquece os dois caminhos; depois de 5 execuções o Postgres passa a usar o plano genérico
+                for _ in range(10):
+                    texto()
+                    preparado()
+
+                plan_texto = tempo_planejamento(cursor, sql, params, 50)
+                plan_prep = tempo_planejamento(cursor, statement.execute_sql, params, 50)
+                ms_texto = tempo_por_chamada(texto, args.chamadas)
+                ms_prep = tempo_por_chamada(preparado, args.chamadas)
+            print(f"  {nome:<28} {plan_texto:10.3f} {plan_prep:10.3f} {ms_texto:8.3f} {ms_prep:8.3f}")
+    finally:
+        conn.close()
+        with setup.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        setup.commit()
+        setup.close()
+
+
+if __name__ == '__main__':
+    main()
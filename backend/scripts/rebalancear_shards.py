@@ -0,0 +1,238 @@
+"""
+Coloca cada usuário no shard que o anel de hash atribui a ele.
+
+Usa a mesma configuração do backend (.env): o shard principal é o
+POSTGRES_HOST e os demais vêm de POSTGRES_SHARDS ('shard1=host[:porta],...').
+Rode com o backend parado (janela de manutenção), nesta ordem, ao passar a
+usar shards ou ao incluir um shard novo:
+
+  --diretorio   cria ou sincroniza o diretório global (usuarios_diretorio,
+                no principal) com os usuários de todos os shards: e-mails
+                alterados são atualizados e ids que não existem em nenhum
+                shard, removidos (com um shard só o backend não mantém o
+                diretório). Também ajusta a sequência de ids, para novos
+                usuários não colidirem;
+  --catalogo    copia posso_te_ajudar e ajuda_content do principal para os
+                demais shards (as recomendações dependem deles);
+  (sem opções)  move os usuários que estão no shard errado: copia as linhas
+                do usuário em todas as tabelas para o shard de destino,
+                confirma, e só então apaga da origem. Os ids de transações,
+                cartões e perguntas são gerados de novo no destino.
+
+As duas primeiras opções só preparam os shards, sem mover ninguém.
+Um movimento interrompido pode ser repetido: se o usuário já estiver no
+destino, só a cópia da origem é apagada. `--dry-run` só lista os movimentos
+e `--verificar` termina com erro se algum usuário estiver fora do lugar.
+
+Uso (a partir de backend/):
+    python -m scripts.rebalancear_shards [--diretorio] [--catalogo] [--dry-run | --verificar]
+"""
+import argparse
+import sys
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.database import db
+
+
+# Tabelas com linhas do usuário, na ordem das chaves estrangeiras (users primeiro)
+TABELAS_USUARIO = (
+    'users', 'transactions', 'transactions_resumo_mensal', 'cartao',
+    'perguntas', 'respostas', 'posso_ajudar_recomendado',
+)
+TABELAS_CATALOGO = (
+    ('posso_te_ajudar', 'idpossoteajudar'),
+    ('ajuda_content', 'idajudacontent'),
+)
+
+
+def colunas(cursor, tabela, com_serial=False) -> list:
+    """Colunas da tabela; sem `com_serial`, omite os ids gerados por sequência (exceto idUser)."""
+    cursor.execute(
+        '''
+            SELECT column_name, column_default LIKE 'nextval%%'
+            FROM information_schema.columns
+            WHERE table_schema = current_schema() AND table_name = %s
+            ORDER BY ordinal_position
+        ''',
+        (tabela,)
+    )
+    return [nome for nome, serial in cursor.fetchall() if com_serial or not serial or nome == 'iduser']
+
+
+def copiar(origem, destino, tabela, cols, filtro='', params=()):
+    """Copia as linhas selecionadas de uma conexão para outra, como um único JSON."""
+    lista = ', '.join(cols)
+    origem.execute(
+        f"SELECT COALESCE(json_agg(t), '[]')::text FROM (SELECT {lista} FROM {tabela} {filtro}) t", params
+    )
+    destino.execute(
+        f"INSERT INTO {tabela} ({lista}) SELECT {lista} FROM json_populate_recordset(NULL::{tabela}, %s::json)",
+        (origem.fetchone()[0],)
+    )
+
+
+def ajustar_sequencia(cursor, tabela, coluna):
+    # Nunca volta a sequência: ids de linhas apagadas não são reaproveitados
+    cursor.execute(
+        f'''
+            SELECT setval(seq, GREATEST((SELECT MAX({coluna}) FROM {tabela}), pg_sequence_last_value(seq), 1))
+            FROM (SELECT pg_get_serial_sequence(%s, %s)::regclass AS seq) s
+        ''',
+        (tabela, coluna)
+    )
+
+
+def preencher_diretorio(router):
+    with db.connection(shard=router.principal) as conn:
+        with conn.cursor() as diretorio:
+            diretorio.execute(
+                '''
+                    CREATE TABLE IF NOT EXISTS usuarios_diretorio (
+                        idUser SERIAL PRIMARY KEY,
+                        email VARCHAR(255) NOT NULL UNIQUE
+                    )
+                '''
+            )
+            diretorio.execute(
+                "CREATE TEMP TABLE usuarios_atuais (LIKE usuarios_diretorio) ON COMMIT DROP"
+            )
+            for shard in router.nomes:
+                with db.connection(shard=shard) as origem_conn:
+                    with origem_conn.cursor() as origem:
+                        origem.execute("SELECT COALESCE(json_agg(t), '[]')::text FROM (SELECT idUser, email FROM users) t")
+                        diretorio.execute(
+                            '''
+                                INSERT INTO usuarios_atuais (idUser, email)
+                                SELECT idUser, email FROM json_populate_recordset(NULL::usuarios_diretorio, %s::json)
+                            ''',
+                            (origem.fetchone()[0],)
+                        )
+                        print(f"{shard}: {diretorio.rowcount} usuário(s)")
+
+            # O mesmo e-mail (ou id) em mais de um shard não tem como ser resolvido aqui
+            diretorio.execute(
+                '''
+                    SELECT 'e-mail ' || email, array_agg(idUser ORDER BY idUser) FROM usuarios_atuais GROUP BY email HAVING COUNT(*) > 1
+                    UNION ALL
+                    SELECT 'id ' || idUser, array_agg(idUser) FROM usuarios_atuais GROUP BY idUser HAVING COUNT(*) > 1
+                '''
+            )
+            duplicados = diretorio.fetchall()
+            if duplicados:
+                for chave, ids in duplicados:
+                    print(f"{chave} repetido nos usuários {ids}")
+                raise SystemExit("Diretório não sincronizado: corrija os usuários repetidos entre shards")
+
+            # Primeiro sai o que está velho (usuários apagados, e-mails trocados), liberando
+            # os e-mails para quem os usa agora; depois entra o que falta
+            diretorio.execute(
+                '''
+                    DELETE FROM usuarios_diretorio d
+                    WHERE NOT EXISTS (SELECT 1 FROM usuarios_atuais a WHERE a.idUser = d.idUser AND a.email = d.email)
+                '''
+            )
+            print(f"{diretorio.rowcount} registro(s) desatualizado(s) removido(s) do diretório")
+            diretorio.execute(
+                '''
+                    INSERT INTO usuarios_diretorio (idUser, email)
+                    SELECT idUser, email FROM usuarios_atuais
+                    ON CONFLICT (idUser) DO UPDATE SET email = EXCLUDED.email
+                    WHERE usuarios_diretorio.email IS DISTINCT FROM EXCLUDED.email
+                '''
+            )
+            print(f"{diretorio.rowcount} usuário(s) incluído(s) no diretório")
+            ajustar_sequencia(diretorio, 'usuarios_diretorio', 'iduser')
+
+
+def copiar_catalogo(router):
+    with db.connection(shard=router.principal) as principal_conn:
+        with principal_conn.cursor() as principal:
+            for shard in router.nomes:
+                if shard == router.principal:
+                    continue
+                with db.connection(shard=shard) as conn:
+                    with conn.cursor() as cursor:
+                        for tabela, chave in TABELAS_CATALOGO:
+                            cols = colunas(principal, tabela, com_serial=True)
+                            lista = ', '.join(cols)
+                            principal.execute(f"SELECT COALESCE(json_agg(t), '[]')::text FROM (SELECT {lista} FROM {tabela}) t")
+                            atualizar = ', '.join(f"{col} = EXCLUDED.{col}" for col in cols if col != chave)
+                            cursor.execute(
+                                f'''
+                                    INSERT INTO {tabela} ({lista})
+                                    SELECT {lista} FROM json_populate_recordset(NULL::{tabela}, %s::json)
+                                    ON CONFLICT ({chave}) DO UPDATE SET {atualizar}
+                                ''',
+                                (principal.fetchone()[0],)
+                            )
+                            ajustar_sequencia(cursor, tabela, chave)
+                            print(f"{shard}: {tabela} com {cursor.rowcount} linha(s) copiada(s)")
+
+
+def fora_do_lugar(router) -> list:
+    movimentos = []
+    for shard in router.nomes:
+        with db.connection(shard=shard) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT idUser FROM users ORDER BY idUser")
+                movimentos.extend(
+                    (idUser, shard, router.shard_de(idUser))
+                    for idUser, in cursor.fetchall()
+                    if router.shard_de(idUser) != shard
+                )
+    return movimentos
+
+
+def mover(idUser, origem, destino):
+    origem_conn = db.connection(shard=origem)
+    destino_conn = db.connection(shard=destino)
+    try:
+        with origem_conn.cursor() as leitura, destino_conn.cursor() as escrita:
+            # Trava o usuário na origem: escritas dele esperam até o fim do movimento
+            leitura.execute("SELECT 1 FROM users WHERE idUser = %s FOR UPDATE", (idUser,))
+            escrita.execute("SELECT 1 FROM users WHERE idUser = %s", (idUser,))
+            if escrita.fetchone() is None:
+                for tabela in TABELAS_USUARIO:
+                    copiar(leitura, escrita, tabela, colunas(leitura, tabela), "WHERE idUser = %s", (idUser,))
+                destino_conn.commit()
+            # As demais tabelas saem junto, pelo ON DELETE CASCADE
+            leitura.execute("DELETE FROM users WHERE idUser = %s", (idUser,))
+        origem_conn.commit()
+    finally:
+        origem_conn.close()
+        destino_conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--diretorio', action='store_true', help='preenche o diretório global de usuários')
+    parser.add_argument('--catalogo', action='store_true', help='copia o catálogo do principal para os demais shards')
+    parser.add_argument('--dry-run', action='store_true', help='só lista os usuários que seriam movidos')
+    parser.add_argument('--verificar', action='store_true', help='termina com erro se algum usuário estiver fora do lugar')
+    args = parser.parse_args()
+
+    router = db.get_shards()
+    print(f"Shards: {', '.join(router.nomes)} (principal: {router.principal})")
+
+    if args.diretorio:
+        preencher_diretorio(router)
+    if args.catalogo:
+        copiar_catalogo(router)
+    if args.diretorio or args.catalogo:
+        return
+
+    movimentos = fora_do_lugar(router)
+    for idUser, origem, destino in movimentos:
+        print(f"usuário {idUser}: {origem} -> {destino}")
+        if not (args.dry_run or args.verificar):
+            mover(idUser, origem, destino)
+    print(f"{len(movimentos)} usuário(s) fora do lugar" + ("" if args.dry_run or args.verificar else ", movido(s)"))
+
+    if args.verificar and movimentos:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Reconstrói a tabela posso_ajudar_recomendado a partir das respostas do questionário.
+
+Use depois de aplicar o init.sql em um banco já populado ou de alterar o
+catálogo de conteúdos (posso_te_ajudar/ajuda_content).
+
+Uso (a partir de backend/):
+    python -m scripts.reconstruir_recomendacoes [--usuario ID]
+"""
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.database.posso_ajudar import PossoAjudarDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuario', type=int, default=None, help='reconstrói apenas este idUser')
+    args = parser.parse_args()
+
+    linhas = PossoAjudarDatabase.rebuild_recomendacoes(args.usuario)
+    alvo = f"usuário {args.usuario}" if args.usuario is not None else "todos os usuários"
+    print(f"Recomendações reconstruídas para {alvo}: {linhas} linha(s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Reconstrói a tabela transactions_resumo_mensal a partir de transactions.
+
+Use depois de aplicar o init.sql em um banco já populado, ou para corrigir
+o resumo de um usuário específico.
+
+Uso (a partir de backend/):
+    python -m scripts.reconstruir_resumo [--usuario ID]
+"""
+import argparse
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.database.transaction_database import TransactionDatabase
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuario', type=int, default=None, help='reconstrói apenas este idUser')
+    args = parser.parse_args()
+
+    linhas = TransactionDatabase.rebuild_resumo_mensal(args.usuario)
+    alvo = f"usuário {args.usuario}" if args.usuario is not None else "todos os usuários"
+    print(f"Resumo mensal reconstruído para {alvo}: {linhas} linha(s)")
+
+
+if __name__ == '__main__':
+    main()
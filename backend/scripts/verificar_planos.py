@@ -0,0 +1,154 @@
+"""
+Verifica se todas as consultas do TransactionDatabase usam índice.
+
+Cria um schema temporário a partir do banco_de_dados/init.sql, popula com
+uma massa sintética grande, executa cada método do TransactionDatabase
+capturando o plano (EXPLAIN FORMAT JSON) de cada SQL emitido e falha se
+algum deles fizer Seq Scan na tabela transactions.
+
+Uso (a partir de backend/):
+    python -m scripts.verificar_planos --usuarios 2000 --transacoes 200
+"""
+import argparse
+import os
+import sys
+from datetime import date
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import psycopg2
+from psycopg2 import extensions
+
+from src.database import db
+from src.database.transaction_database import TransactionDatabase
+
+SCHEMA = 'verificacao_planos'
+INIT_SQL = os.path.join(os.path.dirname(__file__), '..', '..', 'banco_de_dados', 'init.sql')
+
+
+class ExplainCursor(extensions.cursor):
+    """Cursor que registra o plano de cada consulta antes de executá-la."""
+
+    planos = []
+
+    def execute(self, query, vars=None):
+        with extensions.cursor(self.connection) as explain:
+            explain.execute('EXPLAIN (FORMAT JSON) ' + query, vars)
+            ExplainCursor.planos.append((query, explain.fetchone()[0][0]['Plan']))
+        return super().execute(query, vars)
+
+
+def varreduras_sequenciais(plano):
+    if plano.get('Node Type') == 'Seq Scan' and plano.get('Relation Name') == 'transactions':
+        yield plano
+    for filho in plano.get('Plans', []):
+        yield from varreduras_sequenciais(filho)
+
+
+def preparar_schema(usuarios, transacoes):
+    conn = psycopg2.connect(
+        dbname=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=os.getenv("POSTGRES_PORT"),
+    )
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        cursor.execute(f'CREATE SCHEMA {SCHEMA}')
+        cursor.execute(f'SET search_path TO {SCHEMA}, public')
+        with open(INIT_SQL, encoding='utf-8') as arquivo:
+            cursor.execute(arquivo.read())
+        cursor.execute(
+            '''
+                INSERT INTO users (nome, sobrenome, email, senha)
+                SELECT 'Usuario', 'Sintetico', 'sintetico' || i || '@patocash.local', 'x'
+                FROM generate_series(1, %s) i
+            ''',
+            (usuarios,)
+        )
+        cursor.execute(
+            '''
+                INSERT INTO transactions (idUser, estabelecimento, categoria, valor, data)
+                SELECT
+                    u,
+                    'Estabelecimento ' || (t %% 50),
+                    (ARRAY['Alimentação', 'Saúde', 'Transporte', 'Entretenimento', 'Moradia'])[1 + t %% 5],
+                    round((random() * 500)::numeric, 2),
+                    CURRENT_DATE - (random() * 730)::int + 30
+                FROM generate_series(1, %s) u, generate_series(1, %s) t
+            ''',
+            (usuarios, transacoes)
+        )
+        cursor.execute('ANALYZE users, transactions')
+    conn.commit()
+    return conn
+
+
+def consultas(idUser):
+    mes = date.today().strftime('%Y-%m')
+    return [
+        ('get_all_transactions', lambda: TransactionDatabase.get_all_transactions(idUser)),
+        ('get_all_transactions(mes)', lambda: TransactionDatabase.get_all_transactions(idUser, mes)),
+        ('get_all_transactions(categoria)', lambda: TransactionDatabase.get_all_transactions(idUser, None, 'Saúde')),
+        ('get_all_transactions(mes, categoria)', lambda: TransactionDatabase.get_all_transactions(idUser, mes, 'Saúde')),
+        ('get_transactions_categoria', lambda: TransactionDatabase.get_transactions_categoria(idUser, 'Saúde', mes)),
+        ('get_transactions_page', lambda: TransactionDatabase.get_transactions_page(idUser, 50)),
+        ('get_transactions_page(after)', lambda: TransactionDatabase.get_transactions_page(idUser, 50, f'{mes}-01_1')),
+        ('iter_transactions', lambda: list(TransactionDatabase.iter_transactions(idUser))),
+        ('get_dashboard', lambda: TransactionDatabase.get_dashboard(idUser)),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--usuarios', type=int, default=2000)
+    parser.add_argument('--transacoes', type=int, default=200, help='transações por usuário')
+    args = parser.parse_args()
+
+    setup = preparar_schema(args.usuarios, args.transacoes)
+    db._pool = db.ConnectionPool(
+        minconn=1, maxconn=2, timeout=5, validate_after=30,
+        dbname=os.getenv("POSTGRES_DB"),
+        user=os.getenv("POSTGRES_USER"),
+        password=os.getenv("POSTGRES_PASSWORD"),
+        host=os.getenv("POSTGRES_HOST"),
+        port=os.getenv("POSTGRES_PORT"),
+        options=f'-c search_path={SCHEMA},public',
+        cursor_factory=ExplainCursor,
+        # Conexão comum: os comandos saem como texto (sem PREPARE/EXECUTE) para o EXPLAIN
+        connection_factory=extensions.connection,
+    )
+    db._pool_pid = os.getpid()
+    # Todas as consultas no primário (um só shard), onde está o schema de verificação
+    db._shards = db.ShardRouter({'shard0': db.ReplicaSet(db._pool, [], janela=0, max_atraso=0, intervalo=0)})
+    db._shards_pid = os.getpid()
+
+    falhas = 0
+    try:
+        TransactionDatabase.rebuild_resumo_mensal()
+        for nome, executar in consultas(args.usuarios // 2):
+            ExplainCursor.planos.clear()
+            executar()
+            for query, plano in ExplainCursor.planos:
+                if 'transactions' not in query:
+                    continue
+                seq = list(varreduras_sequenciais(plano))
+                status = 'FALHOU' if seq else 'OK'
+                falhas += bool(seq)
+                print(f"{status:7} {nome}: {plano['Node Type']} (custo {plano['Total Cost']})")
+    finally:
+        db._pool.closeall()
+        with setup.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {SCHEMA} CASCADE')
+        setup.commit()
+        setup.close()
+
+    if falhas:
+        print(f"{falhas} consulta(s) com Seq Scan em transactions")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Verifica que respostas fora do formato no questionário não derrubam a
+gravação nem o recálculo das recomendações.
+
+Cria um usuário temporário cuja renda (terceira resposta) não é um número
+e confere que:
+
+  - o questionário é gravado, sem nenhuma recomendação pela renda;
+  - alterar e acrescentar respostas com essa renda gravada funciona;
+  - uma renda com vírgula decimal ("3000,50") é reconhecida;
+  - a reconstrução das recomendações de todos os usuários não falha.
+
+Uso (a partir de backend/):
+    python -m scripts.verificar_questionario
+"""
+import json
+import sys
+import time
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.database.form_database import FormDatabase
+from src.database.posso_ajudar import PossoAjudarDatabase
+from src.database.user_database import UserDatabase
+
+
+# Recomendações que só saem da renda (Economizar também sai do objetivo)
+POR_RENDA = {7, 2}  # Construir reserva de emergência, Investir
+
+
+def verificar(falhas, ok, descricao):
+    print(f"{'OK' if ok else 'FALHOU':7} {descricao}")
+    return falhas + (not ok)
+
+
+def recomendados(idUser) -> set:
+    return {item['idPossoTeAjudar'] for item in PossoAjudarDatabase.posso_ajudar_recomendado(idUser)}
+
+
+def main():
+    falhas = 0
+    idUser = UserDatabase.create_user('Questionario', 'Teste', f'questionario{time.time_ns()}@patocash.local', 'x')
+    try:
+        respostas = [
+            {"pergunta": 1, "resposta": "2"},
+            {"pergunta": 2, "resposta": "2"},
+            {"pergunta": 3, "resposta": "R$ 3.000,00"},
+        ]
+        criado = FormDatabase.create_form(idUser, json.dumps(respostas))
+        falhas = verificar(falhas, criado, "questionário com renda não numérica gravado")
+        falhas = verificar(
+            falhas, not recomendados(idUser) & POR_RENDA, f"sem recomendação pela renda: {sorted(recomendados(idUser))}"
+        )
+
+        documento = FormDatabase.update_answers(idUser, alterar=[(0, "1")], adicionar=["extra"])
+        falhas = verificar(
+            falhas,
+            documento is not None and documento[0]['resposta'] == "1" and len(documento) == 4,
+            "alteração e acréscimo de respostas com a renda não numérica"
+        )
+        falhas = verificar(falhas, FormDatabase.update_last_answer(idUser, "1500"), "alteração da última resposta")
+
+        FormDatabase.update_answers(idUser, alterar=[(2, "3000,50")])
+        falhas = verificar(
+            falhas, 7 in recomendados(idUser), f"renda com vírgula decimal: {sorted(recomendados(idUser))}"
+        )
+
+        try:
+            PossoAjudarDatabase.rebuild_recomendacoes()
+            reconstruido = True
+        except Exception as e:
+            print(f"        {e}")
+            reconstruido = False
+        falhas = verificar(falhas, reconstruido, "reconstrução de todas as recomendações")
+    finally:
+        UserDatabase.delete_user(idUser)
+
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
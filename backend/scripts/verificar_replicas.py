@@ -0,0 +1,84 @@
+"""
+Verifica o roteamento de leituras entre primário e réplicas.
+
+Usa a configuração do .env (POSTGRES_HOST e POSTGRES_REPLICA_HOSTS; com o
+docker-compose.replica.yml, localhost:5432 e localhost:5433). Cria um usuário
+temporário e confere que:
+
+  - a leitura logo depois de uma escrita dele vai para o primário
+    (read-your-writes) e já enxerga a transação inserida;
+  - passada a janela, as leituras vão para as réplicas, em rodízio;
+  - o atraso e a saúde de cada réplica são medidos.
+
+Uso (a partir de backend/):
+    python -m scripts.verificar_replicas [--janela 2]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.database import db
+from src.database.replicas import DB_ROUTES
+from src.database.transaction_database import TransactionDatabase
+from src.database.user_database import UserDatabase
+
+
+def rotas() -> dict:
+    return {
+        (amostra.labels['destino'], amostra.labels['motivo']): amostra.value
+        for metrica in DB_ROUTES.collect()
+        for amostra in metrica.samples
+        if amostra.name.endswith('_total')
+    }
+
+
+def diferenca(antes, depois) -> dict:
+    return {chave: valor - antes.get(chave, 0) for chave, valor in depois.items() if valor != antes.get(chave, 0)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--janela', type=float, default=2, help='janela de read-your-writes usada no teste (s)')
+    args = parser.parse_args()
+
+    os.environ['DB_READ_YOUR_WRITES'] = str(args.janela)
+    replicas = db.get_replicas()
+    if not replicas.replicas:
+        raise SystemExit("Nenhuma réplica configurada em POSTGRES_REPLICA_HOSTS")
+
+    falhas = 0
+    idUser = UserDatabase.create_user('Replica', 'Teste', f'replica{time.time_ns()}@patocash.local', 'x')
+    try:
+        antes = rotas()
+        TransactionDatabase.insert_transaction(idUser, 'Teste', 'Teste', 10, date.today())
+        transacoes = TransactionDatabase.get_all_transactions(idUser)
+        ryw = diferenca(antes, rotas())
+        ok = len(transacoes) == 1 and ('primary', 'read_your_writes') in ryw
+        falhas += not ok
+        print(f"{'OK' if ok else 'FALHOU':7} leitura após escrita: {len(transacoes)} transação(ões), rotas {ryw}")
+
+        time.sleep(args.janela + 0.5)
+        antes = rotas()
+        for _ in range(2 * len(replicas.replicas)):
+            TransactionDatabase.get_all_transactions(idUser)
+        leituras = diferenca(antes, rotas())
+        ok = all(destino != 'primary' for destino, _ in leituras)
+        falhas += not ok
+        print(f"{'OK' if ok else 'FALHOU':7} leituras após a janela: rotas {leituras}")
+
+        for replica in replicas.replicas:
+            print(f"        {replica.nome}: saudável={replica.saudavel} atraso={replica.atraso:.3f}s")
+    finally:
+        UserDatabase.delete_user(idUser)
+
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
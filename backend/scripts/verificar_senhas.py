@@ -0,0 +1,57 @@
+"""
+Verifica o hash e a verificação de senhas longas (mais de 72 bytes), sem
+precisar do banco.
+
+O crypt(..., gen_salt('bf')) do pgcrypto trunca a senha em 72 bytes; o
+bcrypt >= 5 recusa senhas maiores. Confere que:
+
+  - uma senha de 80 bytes é aceita por PasswordHasher.hash e verificada;
+  - um hash no formato do pgcrypto ($2a$, custo 6) de uma senha de 80
+    bytes continua aceitando a mesma senha, e recusa outra;
+  - senhas que só diferem depois do 72º byte são equivalentes, como no pgcrypto.
+
+Uso (a partir de backend/):
+    python -m scripts.verificar_senhas
+"""
+import sys
+
+import bcrypt
+
+from src.database.password_hasher import PasswordHasher
+
+
+def verificar(falhas, ok, descricao):
+    print(f"{'OK' if ok else 'FALHOU':7} {descricao}")
+    return falhas + (not ok)
+
+
+def main():
+    falhas = 0
+    senha = 'patocash' * 10
+    assert len(senha.encode('utf-8')) == 80
+
+    try:
+        senha_hash = PasswordHasher.hash(senha)
+        ok = PasswordHasher.verify(senha, senha_hash)
+    except ValueError as e:
+        print(f"        {e}")
+        ok = False
+    falhas = verificar(falhas, ok, "hash e verificação de uma senha de 80 bytes")
+
+    # Como o pgcrypto gera: prefixo $2a$, custo 6, só os 72 primeiros bytes contam
+    hash_pgcrypto = bcrypt.hashpw(senha.encode('utf-8')[:72], bcrypt.gensalt(6, prefix=b'2a')).decode()
+    falhas = verificar(falhas, PasswordHasher.verify(senha, hash_pgcrypto), "senha de 80 bytes contra hash do pgcrypto")
+    falhas = verificar(
+        falhas, not PasswordHasher.verify('outra' + senha, hash_pgcrypto), "senha diferente recusada"
+    )
+    falhas = verificar(
+        falhas, PasswordHasher.verify(senha[:72] + 'x' * 8, hash_pgcrypto), "bytes depois do 72º ignorados"
+    )
+    falhas = verificar(falhas, PasswordHasher.needs_rehash(hash_pgcrypto), "hash do pgcrypto marcado para rehash")
+
+    if falhas:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+import hashlib
+import logging
+import threading
+import time
+from collections import defaultdict
+from os import getenv
+from types import MappingProxyType
+
+from flask import Response, jsonify, request
+
+from src.database.posso_ajudar import PossoAjudarDatabase
+from src.response.json_response import dumps
+
+
+log = logging.getLogger(__name__)
+
+
+def serializar(dados):
+    """
+    Serializa uma vez e devolve (corpo em bytes, ETag forte do corpo).
+    """
+    corpo = dumps(dados)
+    return corpo, hashlib.sha256(corpo).hexdigest()[:32]
+
+
+class CatalogSnapshot:
+    """
+    Foto imutável do catálogo posso_te_ajudar/ajuda_content com as respostas
+    de cada rota já serializadas. Nunca é alterada: uma recarga cria outra.
+    """
+
+    __slots__ = ('lista', 'itens', 'conteudos', 'versao')
+
+    def __init__(self, posso_ajudar, conteudos):
+        por_posso_ajudar = defaultdict(list)
+        for conteudo in conteudos:
+            por_posso_ajudar[conteudo['idPossoTeAjudar']].append(conteudo)
+
+        self.lista = serializar(posso_ajudar) if posso_ajudar else None
+        self.itens = MappingProxyType({
+            item['idPossoTeAjudar']: serializar(item) for item in posso_ajudar
+        })
+        self.conteudos = MappingProxyType({
+            id: serializar(lista) for id, lista in por_posso_ajudar.items()
+        })
+        self.versao = serializar([posso_ajudar, conteudos])[1]
+
+
+class CatalogCache:
+    """
+    Mantém o snapshot do catálogo em memória. Ele é carregado na subida do app
+    e recarregado quando o TTL expira (por uma única thread, enquanto as demais
+    continuam servindo o snapshot anterior) ou quando `recarregar()` é chamado.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._snapshot = None
+        self._expira_em = 0.0
+        self._lock = threading.Lock()
+
+    def recarregar(self) -> CatalogSnapshot:
+        catalogo = PossoAjudarDatabase.get_catalogo()
+        if catalogo is None:
+            raise RuntimeError("Não foi possível carregar o catálogo do banco")
+        self._snapshot = CatalogSnapshot(*catalogo)
+        self._expira_em = time.monotonic() + self.ttl
+        return self._snapshot
+
+    def snapshot(self) -> CatalogSnapshot:
+        atual = self._snapshot
+        if atual is not None and time.monotonic() < self._expira_em:
+            return atual
+
+        # Sem snapshot todos esperam a carga; com snapshot vencido só uma thread recarrega
+        if self._lock.acquire(blocking=atual is None):
+            try:
+                if self._snapshot is atual:
+                    try:
+                        self.recarregar()
+                    except Exception as e:
+                        if atual is None:
+                            raise
+                        log.warning("Erro ao recarregar o catálogo, mantendo o anterior: %s", e)
+                        self._expira_em = time.monotonic() + self.ttl
+            finally:
+                self._lock.release()
+        return self._snapshot or atual
+
+    def responder(self, entrada):
+        """
+        Monta a resposta de uma entrada (corpo, etag) do snapshot, respondendo
+        304 Not Modified quando o If-None-Match do cliente já tem essa versão.
+        """
+        if entrada is None:
+            return jsonify({"message": "No responses found"}), 404
+
+        corpo, etag = entrada
+        response = Response(corpo, mimetype='application/json')
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
+
+
+catalogo = CatalogCache(ttl=float(getenv("CATALOGO_TTL", "600")))
@@ -0,0 +1,119 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+from os import getenv
+
+from flask import Response, request
+from prometheus_client import Counter, Gauge
+
+
+# Exportadas no /metrics pelo PrometheusMetrics do app (registry padrão)
+CACHE_HITS = Counter('patocash_cache_hits_total', 'Respostas servidas pelo cache', ['cache'])
+CACHE_MISSES = Counter('patocash_cache_misses_total', 'Consultas ao cache sem resposta valida', ['cache'])
+CACHE_EVICTIONS = Counter(
+    'patocash_cache_evictions_total',
+    'Entradas removidas do cache',
+    ['cache', 'motivo']
+)
+CACHE_ENTRIES = Gauge('patocash_cache_entries', 'Entradas atualmente no cache', ['cache'], multiprocess_mode='livesum')
+
+
+class ResponseCache:
+    """
+    Cache LRU com TTL das respostas por usuário, limitado a `max_entries`.
+
+    As chaves são (idUser, endpoint, parâmetros) e as entradas de um usuário
+    podem ser invalidadas de uma vez quando os dados dele mudam. O cache é
+    local ao processo: em outros pods/workers a entrada vale até o TTL, então
+    o TTL é o atraso máximo que um usuário pode ver depois de uma escrita
+    atendida por outro worker.
+    """
+
+    def __init__(self, nome, max_entries, ttl):
+        self.nome = nome
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._por_usuario = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def _remover(self, chave, motivo):
+        self._entries.pop(chave, None)
+        chaves = self._por_usuario.get(chave[0])
+        if chaves is not None:
+            chaves.discard(chave)
+            if not chaves:
+                del self._por_usuario[chave[0]]
+        CACHE_EVICTIONS.labels(self.nome, motivo).inc()
+
+    def get(self, chave):
+        with self._lock:
+            entrada = self._entries.get(chave)
+            if entrada is not None:
+                expira_em, valor = entrada
+                if expira_em > time.monotonic():
+                    self._entries.move_to_end(chave)
+                    CACHE_HITS.labels(self.nome).inc()
+                    return valor
+                self._remover(chave, 'ttl')
+                CACHE_ENTRIES.labels(self.nome).set(len(self._entries))
+        CACHE_MISSES.labels(self.nome).inc()
+        return None
+
+    def set(self, chave, valor):
+        with self._lock:
+            self._entries[chave] = (time.monotonic() + self.ttl, valor)
+            self._entries.move_to_end(chave)
+            self._por_usuario[chave[0]].add(chave)
+            while len(self._entries) > self.max_entries:
+                self._remover(next(iter(self._entries)), 'lru')
+            CACHE_ENTRIES.labels(self.nome).set(len(self._entries))
+
+    def invalidate_user(self, idUser):
+        with self._lock:
+            for chave in list(self._por_usuario.get(int(idUser), ())):
+                self._remover(chave, 'invalidacao')
+            CACHE_ENTRIES.labels(self.nome).set(len(self._entries))
+
+    def clear(self):
+        with self._lock:
+            for chave in list(self._entries):
+                self._remover(chave, 'invalidacao')
+            CACHE_ENTRIES.labels(self.nome).set(0)
+
+    def cached(self, endpoint):
+        """
+        Decorador para rotas `/<rota>/id=<int:id>`: guarda o corpo das
+        respostas 200 por (id, endpoint, query string), junto com a ETag
+        calculada uma única vez, quando a entrada é criada.
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(id, *args, **kwargs):
+                chave = (int(id), endpoint, tuple(sorted(request.args.items(multi=True))))
+                entrada = self.get(chave)
+                if entrada is None:
+                    response = view(id, *args, **kwargs)
+                    if not isinstance(response, Response) or response.status_code != 200 or response.is_streamed:
+                        return response
+                    corpo = response.get_data()
+                    entrada = (corpo, response.mimetype, hashlib.sha256(corpo).hexdigest()[:32])
+                    self.set(chave, entrada)
+
+                corpo, mimetype, etag = entrada
+                response = Response(corpo, mimetype=mimetype)
+                response.set_etag(etag)
+                response.headers['Cache-Control'] = 'private, no-cache'
+                return response
+            return wrapper
+        return decorator
+
+# TTL curto: a invalidação só alcança o worker que fez a escrita, e os
+# demais (gthread, vários pods) servem a entrada antiga até ela expirar
+analytics_cache = ResponseCache(
+    'analytics',
+    max_entries=int(getenv("CACHE_ANALYTICS_MAX_ENTRIES", "2048")),
+    ttl=float(getenv("CACHE_ANALYTICS_TTL", "5")),
+)
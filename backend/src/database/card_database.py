@@ -1,5 +1,12 @@
-from src.database.db import connection
+import logging
+from decimal import Decimal, InvalidOperation
+from psycopg2.extras import execute_values
+from src.database.db import connection, execute_prepared, marcar_escrita, shards
+from src.database.instrumentation import instrumentar
 
+log = logging.getLogger(__name__)
+
+@instrumentar
 class CardDatabase:
   
   @staticmethod
@@ -9,26 +16,76 @@ class CardDatabase:
       "idUser": card_tuple[1],
       "numero": card_tuple[2],
       "nome": card_tuple[3],
-      "meta": float(card_tuple[4]),
+      "meta": card_tuple[4],
       "tipo": card_tuple[5]
     }
   
+  # Gasto do último mês comparado com a meta de cada cartão, na mesma janela
+  # móvel do gasto por categoria do dashboard (/transacao_categoria, usado em /metas)
+  SQL_CARTOES_PROGRESSO = """
+    SELECT c.idCartao, c.idUser, c.numero, c.nome, c.meta::float8, c.tipo,
+           g.gasto::float8,
+           (c.meta - g.gasto)::float8,
+           CASE WHEN c.meta > 0 THEN round(g.gasto / c.meta * 100, 2)::float8 END
+    FROM cartao c
+    CROSS JOIN (
+      SELECT COALESCE(SUM(valor), 0) AS gasto
+      FROM transactions
+      WHERE idUser = %s
+      AND data >= NOW() - INTERVAL '1 months'
+      AND data <= NOW()
+    ) g
+    WHERE c.idUser = %s
+    ORDER BY c.idCartao
+  """
+
+  # Campos alteráveis e o tipo de cada um na lista VALUES do UPDATE em lote
+  CAMPOS_EDITAVEIS = {'numero': 'varchar', 'nome': 'varchar', 'meta': 'numeric', 'tipo': 'varchar'}
+
   @staticmethod
-  def get_all_cards(idUser):
-    conn = connection()
-    print(idUser)
+  def get_all_cards(idUser, progresso=False):
+    """
+    Cartões do usuário. Com `progresso`, cada cartão traz também o gasto do
+    último mês (mesma janela de /transacao_categoria), quanto resta da meta
+    e a porcentagem usada, calculados na mesma consulta.
+    """
+    conn = connection(leitura=True, idUser=idUser)
+    log.debug("Listando cartões", extra={'idUser': idUser, 'amostragem': 0.01})
     if conn:
       with conn.cursor() as cursor:
-        cursor.execute("SELECT * FROM cartao WHERE idUser = %s", (idUser,))
+        if progresso:
+          execute_prepared(cursor, CardDatabase.SQL_CARTOES_PROGRESSO, (idUser, idUser))
+        else:
+          # meta como float8 já sai no formato do JSON
+          execute_prepared(
+            cursor,
+            "SELECT idCartao, idUser, numero, nome, meta::float8, tipo FROM cartao WHERE idUser = %s",
+            (idUser,)
+          )
         cards = cursor.fetchall()
       conn.close()
+      if progresso:
+        return [
+          {**CardDatabase.format_card_data(card), "gasto_mes": card[6], "restante": card[7], "porcentagem": card[8]}
+          for card in cards
+        ]
       cards = [CardDatabase.format_card_data(card) for card in cards]
       return cards
     return []
 
+  @staticmethod
+  def conexao_do_cartao(idUser):
+    """
+    Conexão para alterar um cartão. idCartao é sequencial por shard, então
+    com mais de um shard o cartão só é localizado junto com o dono.
+    """
+    if idUser is None and len(shards()) > 1:
+      raise ValueError("idUser é obrigatório para alterar cartões com mais de um shard")
+    return connection(idUser=idUser)
+
   @staticmethod
   def create_card(idUser, numero, nome, meta,tipo):
-    conn = connection()
+    conn = connection(idUser=idUser)
     if conn:
       with conn.cursor() as cursor:
         cursor.execute(
@@ -37,22 +94,92 @@ class CardDatabase:
         )
         conn.commit()
       conn.close()
+      marcar_escrita(idUser)
 
   @staticmethod
-  def update_card(idCartao, **kwargs):
-    conn = connection()
-    if conn:
+  def validar_cartao(cartao) -> tuple:
+    """
+    Valida um item do lote de update_cards e devolve (idCartao, campos)
+    prontos para gravação. Levanta ValueError se inválido.
+    """
+    campos = CardDatabase.CAMPOS_EDITAVEIS
+    if not isinstance(cartao, dict):
+      raise ValueError("cada cartão deve ser um objeto")
+    desconhecidos = set(cartao) - {'idCartao', *campos}
+    if desconhecidos:
+      raise ValueError(f"campos não alteráveis: {', '.join(sorted(desconhecidos))} (aceitos: {', '.join(campos)})")
+
+    idCartao = cartao.get('idCartao')
+    if isinstance(idCartao, bool) or not isinstance(idCartao, (int, str)) or not str(idCartao).strip().isdigit():
+      raise ValueError(f"idCartao inválido: {idCartao!r}")
+
+    valores = {}
+    for campo, valor in cartao.items():
+      if campo == 'idCartao':
+        continue
+      if campo == 'meta':
+        try:
+          meta = Decimal(str(valor).strip()).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+          raise ValueError(f"meta inválida: {valor!r}")
+        if isinstance(valor, bool) or not meta.is_finite() or abs(meta) >= Decimal('100000000'):
+          raise ValueError(f"meta inválida: {valor!r}")
+        valores[campo] = meta
+      else:
+        texto = str(valor).strip() if isinstance(valor, (str, int)) and not isinstance(valor, bool) else ''
+        if not texto or len(texto) > 255:
+          raise ValueError(f"{campo} vazio ou com mais de 255 caracteres")
+        valores[campo] = texto
+    return int(idCartao), valores
+
+  @staticmethod
+  def update_cards(cartoes, idUser=None) -> list:
+    """
+    Altera vários cartões em um único UPDATE ... FROM (VALUES ...). Cada item
+    de `cartoes` traz idCartao e os campos a alterar (de CAMPOS_EDITAVEIS),
+    validados por validar_cartao antes de pegar a conexão; os ausentes
+    ficam como estão. Com `idUser`, só cartões dele são
+    alterados. Retorna os idCartao alterados.
+    """
+    campos = list(CardDatabase.CAMPOS_EDITAVEIS)
+    alteracoes = {}
+    for cartao in cartoes:
+      idCartao, valores = CardDatabase.validar_cartao(cartao)
+      # O mesmo cartão repetido no lote vira uma linha só, com a última alteração de cada campo
+      alteracoes.setdefault(idCartao, {}).update(valores)
+    if not alteracoes:
+      return []
+
+    conn = CardDatabase.conexao_do_cartao(idUser)
+    if not conn:
+      return []
+    tipos = ', '.join(f"%s::{tipo}" for tipo in CardDatabase.CAMPOS_EDITAVEIS.values())
+    with conn:
       with conn.cursor() as cursor:
-        for key, value in kwargs.items():
-          cursor.execute(f"UPDATE cartao SET {key} = %s WHERE idCartao = %s", (value, idCartao))
-        conn.commit()
-      conn.close()
+        alterados = execute_values(
+          cursor,
+          f"""
+            UPDATE cartao c
+            SET {', '.join(f"{campo} = COALESCE(v.{campo}, c.{campo})" for campo in campos)}
+            FROM (VALUES %s) AS v (idCartao, idUser, {', '.join(campos)})
+            WHERE c.idCartao = v.idCartao AND c.idUser = COALESCE(v.idUser, c.idUser)
+            RETURNING c.idCartao, c.idUser
+          """,
+          [(idCartao, idUser, *(cartao.get(campo) for campo in campos)) for idCartao, cartao in alteracoes.items()],
+          template=f"(%s::int, %s::int, {tipos})",
+          page_size=len(alteracoes),
+          fetch=True
+        )
+    # Os donos dos cartões leem do primário logo depois da alteração
+    for dono in {dono for _, dono in alterados}:
+      marcar_escrita(dono)
+    return [idCartao for idCartao, _ in alterados]
+
+  @staticmethod
+  def update_card(idCartao, idUser=None, **kwargs):
+    if kwargs:
+      CardDatabase.update_cards([{'idCartao': idCartao, **kwargs}], idUser)
       
   @staticmethod
-  def update_card_meta(idCartao, meta):
-    conn = connection()
-    if conn:
-      with conn.cursor() as cursor:
-        cursor.execute("UPDATE cartao SET meta = %s WHERE idCartao = %s", (meta, idCartao))
-        conn.commit()
-      conn.close()
\ No newline at end of file
+  def update_card_meta(idCartao, meta, idUser=None):
+    CardDatabase.update_cards([{'idCartao': idCartao, 'meta': meta}], idUser)
@@ -1,17 +1,598 @@
+import contextvars
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from collections import deque
+from os import getenv, getpid
+
 import psycopg2
-from os import getenv
+from psycopg2 import errors, extensions
+from prometheus_client import Counter, Gauge, Histogram
 
-def connection():
-    try:
-        conn = psycopg2.connect(
-            dbname= getenv("POSTGRES_DB"),
-            user= getenv("POSTGRES_USER"),
-            password=getenv("POSTGRES_PASSWORD"),
-            host=getenv("POSTGRES_HOST"),
-            port=getenv("POSTGRES_PORT"),
-        )
-        print("Connected to the database")
+from src.database.instrumentation import InstrumentedCursor, nome_consulta, registrar_espera
+from src.database.replicas import Replica, ReplicaSet
+from src.database.shards import ShardRouter
+from src.database.slow_query import registrar_preparado
+
+
+log = logging.getLogger(__name__)
+
+
+# Métricas do pool, exportadas pelo mesmo registry do PrometheusMetrics (/metrics)
+POOL_CONNECTIONS = Gauge(
+    'patocash_db_pool_connections',
+    'Conexoes fisicas do pool por estado',
+    ['pool', 'state'],
+    multiprocess_mode='livesum'
+)
+POOL_CREATED = Counter(
+    'patocash_db_pool_created_total',
+    'Conexoes fisicas abertas pelo pool'
+)
+POOL_DISCARDED = Counter(
+    'patocash_db_pool_discarded_total',
+    'Conexoes descartadas (quebradas ou invalidas)'
+)
+POOL_TIMEOUTS = Counter(
+    'patocash_db_pool_timeouts_total',
+    'Checkouts que estouraram o tempo de espera'
+)
+POOL_WAIT = Histogram(
+    'patocash_db_pool_wait_seconds',
+    'Tempo de espera para obter uma conexao do pool',
+    ['consulta']
+)
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou disponível dentro do tempo de espera do pool."""
+
+
+class BancoIndisponivel(psycopg2.OperationalError):
+    """
+    `connection()` não conseguiu uma conexão: pool esgotado ou banco fora do
+    ar. O app responde 503; quem já trata psycopg2.Error continua tratando.
+    """
+
+
+class PreparedConnection(extensions.connection):
+    """
+    Conexão do pool que guarda os nomes dos comandos já preparados na sessão.
+    Uma conexão nova (ou substituída pelo pool) começa sem nenhum.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparados = set()
+
+
+class ConnectionPool:
+    """
+    Pool de conexões PostgreSQL compartilhado por todas as threads do processo.
+
+    Conexões ociosas são reaproveitadas (LIFO); as que ficaram paradas mais
+    que `validate_after` segundos são testadas com `SELECT 1` antes de serem
+    entregues, e as quebradas são descartadas e substituídas.
+    """
+
+    def __init__(self, minconn, maxconn, timeout, validate_after, nome='primary', **dsn):
+        self.nome = nome
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.validate_after = validate_after
+        self._dsn = dsn
+        self._idle = deque()
+        self._size = 0
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition(threading.RLock())
+
+        for _ in range(minconn):
+            conn = self._connect()
+            with self._cond:
+                self._size += 1
+                self._idle.append((conn, time.monotonic()))
+        self._update_gauges()
+
+    def _connect(self):
+        conn = psycopg2.connect(**{
+            'connection_factory': PreparedConnection,
+            'cursor_factory': InstrumentedCursor,
+            **self._dsn,
+        })
+        POOL_CREATED.inc()
+        log.debug("Conexão com o banco aberta", extra={'pool_size': self._size})
         return conn
-    except Exception as e:
-        print(f"Error connecting to the database: {e}")
-        return None
\ No newline at end of file
+
+    def _update_gauges(self):
+        POOL_CONNECTIONS.labels(self.nome, 'idle').set(len(self._idle))
+        POOL_CONNECTIONS.labels(self.nome, 'in_use').set(self._in_use)
+
+    def _is_usable(self, conn, idle_since):
+        if conn.closed:
+            return False
+        if time.monotonic() - idle_since < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        POOL_DISCARDED.inc()
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+
+    def acquire(self, timeout=None):
+        """
+        Retira uma conexão do pool, abrindo uma nova se ainda houver espaço.
+
+        Levanta PoolTimeoutError se nenhuma conexão for liberada em `timeout`
+        segundos (padrão: o timeout configurado no pool).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn = None
+            with self._cond:
+                while True:
+                    if self._idle:
+                        conn, idle_since = self._idle.pop()
+                        break
+                    if self._size < self.maxconn:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        POOL_TIMEOUTS.inc()
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão livre após {timeout}s (max={self.maxconn})"
+                        )
+                    self._waiting += 1
+                    try:
+                        self._cond.wait(remaining)
+                    finally:
+                        self._waiting -= 1
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(conn, idle_since):
+                self._discard(conn)
+                continue
+
+            with self._cond:
+                self._in_use += 1
+                self._update_gauges()
+            espera = time.monotonic() - start
+            POOL_WAIT.labels(nome_consulta()).observe(espera)
+            registrar_espera(espera)
+            return conn
+
+    def release(self, conn):
+        """
+        Devolve a conexão ao pool. Transações abertas são desfeitas e conexões
+        quebradas são descartadas em vez de reaproveitadas.
+        """
+        status = extensions.TRANSACTION_STATUS_UNKNOWN if conn.closed else conn.info.transaction_status
+        if status not in (extensions.TRANSACTION_STATUS_IDLE, extensions.TRANSACTION_STATUS_UNKNOWN):
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                status = extensions.TRANSACTION_STATUS_UNKNOWN
+
+        if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+            self._discard(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if status != extensions.TRANSACTION_STATUS_UNKNOWN:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+            self._update_gauges()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                'min': self.minconn,
+                'max': self.maxconn,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'waiting': self._waiting,
+            }
+
+    def closeall(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._size -= 1
+            self._update_gauges()
+
+
+class PooledConnection:
+    """
+    Conexão emprestada do pool. Expõe a mesma interface da conexão do psycopg2,
+    mas `close()` devolve a conexão ao pool e `with` faz commit/rollback e
+    também a devolve, garantindo que nenhum caminho vaze conexões.
+    """
+
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise psycopg2.InterfaceError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def close(self):
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            self._pool.release(conn)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        try:
+            if self._conn is not None and not self._conn.closed:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+    def __del__(self):
+        self.close()
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Retorna o pool do processo, criando-o na primeira chamada. Depois de um
+    fork o pool herdado é abandonado e um novo é criado no processo filho.
+    """
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == getpid():
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != getpid():
+            _pool = ConnectionPool(
+                minconn=int(getenv("DB_POOL_MIN", "1")),
+                maxconn=int(getenv("DB_POOL_MAX", "10")),
+                timeout=float(getenv("DB_POOL_TIMEOUT", "5")),
+                validate_after=float(getenv("DB_POOL_VALIDATE_AFTER", "30")),
+                dbname=getenv("POSTGRES_DB"),
+                user=getenv("POSTGRES_USER"),
+                password=getenv("POSTGRES_PASSWORD"),
+                host=getenv("POSTGRES_HOST"),
+                port=getenv("POSTGRES_PORT"),
+            )
+            _pool_pid = getpid()
+    return _pool
+
+
+def pool_stats() -> dict:
+    return _pool.stats() if _pool is not None else {}
+
+
+def _pool_extra(nome, host, port, minconn=0) -> ConnectionPool:
+    # Sem conexões na criação: um banco extra fora do ar não impede o app de subir
+    return ConnectionPool(
+        minconn=minconn,
+        maxconn=int(getenv("DB_POOL_MAX", "10")),
+        timeout=float(getenv("DB_POOL_TIMEOUT", "5")),
+        validate_after=float(getenv("DB_POOL_VALIDATE_AFTER", "30")),
+        nome=nome,
+        dbname=getenv("POSTGRES_DB"),
+        user=getenv("POSTGRES_USER"),
+        password=getenv("POSTGRES_PASSWORD"),
+        host=host,
+        port=port or getenv("POSTGRES_PORT"),
+    )
+
+
+def _enderecos(variavel):
+    for item in filter(None, getenv(variavel, "").split(',')):
+        nome, _, endereco = item.strip().rpartition('=')
+        host, _, port = endereco.partition(':')
+        yield nome, host, port
+
+
+def _replica_set(primario, replicas, shard) -> ReplicaSet:
+    return ReplicaSet(
+        primario,
+        replicas,
+        janela=float(getenv("DB_READ_YOUR_WRITES", "10")),
+        max_atraso=float(getenv("DB_REPLICA_MAX_LAG", "5")),
+        intervalo=float(getenv("DB_REPLICA_CHECK_INTERVAL", "5")),
+        shard=shard,
+    )
+
+
+_shards = None
+_shards_pid = None
+
+
+def get_shards() -> ShardRouter:
+    """
+    Retorna o roteador de shards do processo. O shard principal ('shard0') é
+    o POSTGRES_HOST, com as réplicas de POSTGRES_REPLICA_HOSTS ('host[:porta],...');
+    os demais vêm de POSTGRES_SHARDS ('shard1=host[:porta],...'), todos com o
+    mesmo banco, usuário e senha. Sem POSTGRES_SHARDS, tudo fica no principal.
+    """
+    global _shards, _shards_pid
+    if _shards is not None and _shards_pid == getpid():
+        return _shards
+    primario = get_pool()
+    with _pool_lock:
+        if _shards is None or _shards_pid != getpid():
+            replicas = [
+                Replica(f"replica{i}", _pool_extra(f"replica{i}", host, port))
+                for i, (_, host, port) in enumerate(_enderecos("POSTGRES_REPLICA_HOSTS"))
+            ]
+            shards = {'shard0': _replica_set(primario, replicas, 'shard0')}
+            for nome, host, port in _enderecos("POSTGRES_SHARDS"):
+                if not nome or nome in shards:
+                    raise ValueError(f"POSTGRES_SHARDS: nome de shard inválido ou repetido em {nome!r}")
+                shards[nome] = _replica_set(_pool_extra(nome, host, port), [], nome)
+            _shards = ShardRouter(shards, principal='shard0', vnodes=int(getenv("DB_SHARD_VNODES", "128")))
+            _shards_pid = getpid()
+    return _shards
+
+
+def get_replicas(shard=None) -> ReplicaSet:
+    """Primário + réplicas de um shard (padrão: o principal)."""
+    return get_shards().replicas(shard)
+
+
+def shard_de(idUser) -> str:
+    return get_shards().shard_de(idUser)
+
+
+def shards() -> list:
+    """Nomes de todos os shards, para as operações que percorrem todos eles."""
+    return get_shards().nomes
+
+
+def marcar_escrita(idUser):
+    """
+    Registra uma escrita do usuário: as leituras dele vão para o primário
+    do shard dele durante a janela de read-your-writes (DB_READ_YOUR_WRITES segundos).
+    """
+    if idUser is not None:
+        get_replicas(shard_de(idUser)).marcar_escrita(idUser)
+
+
+def connection(leitura=False, idUser=None, shard=None):
+    """
+    Empresta uma conexão do pool. O banco é o shard de `idUser` (ou `shard`,
+    se informado; sem nenhum dos dois, o shard principal). Com `leitura=True`
+    a conexão pode vir de uma réplica (ver ReplicaSet); `idUser` aplica o
+    read-your-writes. Se a réplica escolhida falhar, a leitura cai para o
+    primário do shard. Levanta BancoIndisponivel se nem o primário atender.
+    """
+    try:
+        if shard is None and idUser is not None:
+            shard = shard_de(idUser)
+        replicas = get_replicas(shard)
+        pool, replica = replicas.escolher(leitura, idUser)
+        if replica is not None:
+            try:
+                return PooledConnection(pool, pool.acquire())
+            except Exception as e:
+                replicas.falhou(replica, e)
+                pool = replicas.primario
+        return PooledConnection(pool, pool.acquire())
+    except (PoolTimeoutError, psycopg2.OperationalError) as e:
+        log.error("Erro ao conectar no banco: %s", e)
+        raise BancoIndisponivel(str(e)) from e
+
+
+_PLACEHOLDER = re.compile(r'%(%|s|\()')
+
+
+class PreparedStatement:
+    """
+    Comando SQL preparado no servidor (PREPARE) na primeira execução em cada
+    conexão do pool e executado por nome (EXECUTE) nas seguintes, evitando o
+    parse e, depois de algumas execuções, o planejamento a cada chamada.
+
+    O SQL usa os mesmos placeholders `%s` do psycopg2. Em conexões que não
+    vêm do pool (ex.: scripts), o texto é executado normalmente.
+    """
+
+    def __init__(self, sql):
+        numero = 0
+
+        def trocar(match):
+            nonlocal numero
+            if match.group(1) == '(':
+                raise ValueError("comandos preparados aceitam apenas placeholders posicionais (%s)")
+            if match.group(1) == '%':
+                return '%'
+            numero += 1
+            return f'${numero}'
+
+        self.sql = sql
+        self.nome = 'patocash_' + hashlib.sha1(sql.encode('utf-8')).hexdigest()[:16]
+        self.prepare_sql = f"PREPARE {self.nome} AS {_PLACEHOLDER.sub(trocar, sql)}"
+        self.execute_sql = f"EXECUTE {self.nome}" + (f" ({', '.join(['%s'] * numero)})" if numero else "")
+        registrar_preparado(self.nome, sql)
+
+    def execute(self, cursor, params=()):
+        conn = cursor.connection
+        preparados = getattr(conn, 'preparados', None)
+        if preparados is None:
+            return cursor.execute(self.sql, params)
+
+        # Só dá para repetir com segurança se o erro abortar uma transação sem nada antes
+        ocioso = conn.info.transaction_status == extensions.TRANSACTION_STATUS_IDLE
+        try:
+            return self._executar(cursor, preparados, params)
+        except errors.InvalidSqlStatementName:
+            # A sessão foi reiniciada (ex.: DISCARD ALL) e perdeu os comandos preparados
+            preparados.clear()
+            if not ocioso:
+                raise
+        except errors.DuplicatePreparedStatement:
+            preparados.add(self.nome)
+            if not ocioso:
+                raise
+        conn.rollback()
+        return self._executar(cursor, preparados, params)
+
+    def _executar(self, cursor, preparados, params):
+        if self.nome not in preparados:
+            cursor.execute(self.prepare_sql)
+            preparados.add(self.nome)
+        return cursor.execute(self.execute_sql, params)
+
+
+_statements = {}
+_statements_lock = threading.Lock()
+
+
+def prepared(sql) -> PreparedStatement:
+    """
+    Retorna o comando preparado do registro para `sql`, criando-o na primeira
+    chamada. O nome é derivado do texto, então o mesmo SQL montado em lugares
+    diferentes reaproveita o mesmo comando.
+    """
+    statement = _statements.get(sql)
+    if statement is None:
+        with _statements_lock:
+            statement = _statements.setdefault(sql, PreparedStatement(sql))
+    return statement
+
+
+def execute_prepared(cursor, sql, params=()):
+    return prepared(sql).execute(cursor, params)
+
+
+class IterableReader:
+    """
+    Objeto tipo arquivo que lê de um iterável de strings sob demanda. Permite
+    alimentar `copy_expert(... FROM STDIN ...)` sem montar o conteúdo inteiro
+    em memória.
+    """
+
+    def __init__(self, blocos):
+        self._blocos = iter(blocos)
+        self._pendente = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self._pendente) < size:
+            try:
+                self._pendente += next(self._blocos)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self._pendente)
+        dados, self._pendente = self._pendente[:size], self._pendente[size:]
+        return dados
+
+
+def copy_to_iter(sql, params=None, tamanho_bloco=65536, max_blocos=8, leitura=False, idUser=None):
+    """
+    Executa um `COPY ... TO STDOUT` e gera a saída em blocos de bytes. Como o
+    COPY não aceita parâmetros no servidor, `params` é interpolado pelo driver.
+
+    O COPY roda em uma thread que escreve em uma fila limitada a `max_blocos`
+    blocos, então a memória usada é constante e o banco só avança à medida que
+    o consumidor lê. Se o consumidor parar (ex.: cliente desconectou), o COPY
+    é cancelado no servidor e a conexão volta ao pool. `leitura` e `idUser`
+    escolhem a conexão como em `connection()`.
+    """
+    # O nome da consulta e a conexão são resolvidos agora: quando o gerador
+    # rodar, quem o pediu já retornou e a resposta (status 200) já começou
+    return _copy_to_iter(nome_consulta(), sql, params, tamanho_bloco, max_blocos, connection(leitura, idUser))
+
+
+def _copy_to_iter(consulta, sql, params, tamanho_bloco, max_blocos, conn):
+
+    fila = queue.Queue(max_blocos)
+    cancelado = threading.Event()
+    fim = object()
+
+    def enfileirar(item):
+        while not cancelado.is_set():
+            try:
+                fila.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+        raise RuntimeError("COPY cancelado pelo consumidor")
+
+    class Escritor:
+        def __init__(self):
+            self.buffer = bytearray()
+
+        def write(self, dados):
+            self.buffer += dados
+            if len(self.buffer) >= tamanho_bloco:
+                enfileirar(bytes(self.buffer))
+                self.buffer.clear()
+
+    def produzir():
+        escritor = Escritor()
+        try:
+            with conn.cursor() as cursor:
+                cursor.consulta = consulta
+                comando = sql
+                if params is not None:
+                    comando = cursor.mogrify(sql, params).decode(extensions.encodings[conn.encoding])
+                cursor.copy_expert(comando, escritor)
+            if escritor.buffer:
+                enfileirar(bytes(escritor.buffer))
+            enfileirar(fim)
+        except Exception as e:
+            if not cancelado.is_set():
+                try:
+                    enfileirar(e)
+                except RuntimeError:
+                    pass
+
+    # A thread herda o contexto da requisição, para o COPY entrar no tempo em banco dela
+    produtor = threading.Thread(target=contextvars.copy_context().run, args=(produzir,), daemon=True)
+    produtor.start()
+    try:
+        while True:
+            item = fila.get()
+            if item is fim:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        cancelado.set()
+        if produtor.is_alive():
+            conn.cancel()
+        produtor.join()
+        conn.close()
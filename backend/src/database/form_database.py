@@ -1,4 +1,7 @@
-from src.database.db import connection
+import logging
+from src.database.db import connection, marcar_escrita
+from src.database.instrumentation import instrumentar
+from src.database.posso_ajudar import PossoAjudarDatabase
 import json
 
 
@@ -8,6 +11,9 @@ import json
 #   CONSTRAINT fk_pergunta_user FOREIGN KEY (idUser) REFERENCES users (idUser) ON DELETE CASCADE ON UPDATE CASCADE
 # );
 
+log = logging.getLogger(__name__)
+
+@instrumentar
 class FormDatabase:
     
     @staticmethod
@@ -18,45 +24,89 @@ class FormDatabase:
         
     @staticmethod
     def get_all_forms(idUser):
-        conn = connection()
+        conn = connection(leitura=True, idUser=idUser)
         if conn:
             with conn.cursor() as cursor:
                 cursor.execute("SELECT * FROM respostas WHERE idUser = %s", (idUser,))
                 forms = cursor.fetchall()
             conn.close()
-            print(forms)
+            log.debug("Respostas do questionário carregadas", extra={'idUser': idUser, 'quantidade': len(forms)})
             forms = [FormDatabase.format_form_data(form) for form in forms]
             return forms
         return []
     
     @staticmethod
     def create_form(idUser, resposta):
-        conn = connection()
+        conn = connection(idUser=idUser)
         if conn:
             with conn.cursor() as cursor:
                 cursor.execute("INSERT INTO respostas (idUser, resposta) VALUES (%s, %s)", (idUser, resposta))
+                PossoAjudarDatabase.atualizar_recomendacoes(cursor, idUser)
                 conn.commit()
             conn.close()
+            marcar_escrita(idUser)
             return True
         return False
     
     @staticmethod
-    def update_last_answer(idUser, new_resposta):
-        conn = connection()
-        if conn:
+    def update_answers(idUser, alterar=(), adicionar=()):
+        """
+        Altera e acrescenta respostas do questionário em um único UPDATE,
+        feito no próprio Postgres (jsonb_set e ||), sem ler o documento antes:
+        alterações concorrentes não se sobrescrevem.
+
+        `alterar` é uma lista de (índice, resposta), com índices negativos
+        contados do fim como em Python; `adicionar` é uma lista de respostas
+        acrescentadas ao fim, com o número da pergunta seguinte. As
+        recomendações são recalculadas na mesma transação, só quando muda
+        uma das respostas que elas usam (as três primeiras).
+
+        Retorna o novo documento, ou None se o usuário não tiver respostas ou
+        algum índice estiver fora do questionário.
+        """
+        alterar = [(int(indice), resposta) for indice, resposta in alterar]
+        documento = "resposta"
+        params = []
+        for indice, resposta in alterar:
+            documento = f"jsonb_set({documento}, %s::text[], %s::jsonb, false)"
+            params.extend([[str(indice), 'resposta'], json.dumps(resposta)])
+        for numero, resposta in enumerate(adicionar, start=1):
+            documento = (
+                f"{documento} || jsonb_build_array(jsonb_build_object("
+                f"'pergunta', jsonb_array_length(resposta) + {numero}, 'resposta', %s::jsonb))"
+            )
+            params.append(json.dumps(resposta))
+
+        # O índice i existe se o questionário tiver mais que i (ou -i - 1) respostas
+        minimo = max((indice if indice >= 0 else -indice - 1 for indice, _ in alterar), default=-1)
+        params.extend([idUser, minimo])
+
+        conn = connection(idUser=idUser)
+        if not conn:
+            return None
+        with conn:
             with conn.cursor() as cursor:
-                # Busca as respostas atuais
-                cursor.execute("SELECT resposta FROM respostas WHERE idUser = %s", (idUser,))
-                result = cursor.fetchone()
-                if result:
-                    respostas = result[0] if isinstance(result[0], list) else json.loads(result[0])
-                    if respostas:
-                        # Altera a resposta da última pergunta
-                        respostas[-1]['resposta'] = new_resposta
-                        respostas_json = json.dumps(respostas)
-                        cursor.execute("UPDATE respostas SET resposta = %s WHERE idUser = %s", (respostas_json, idUser))
-                        conn.commit()
-                        conn.close()
-                        return True
-            conn.close()
-        return False
\ No newline at end of file
+                # O documento anterior (travado) diz se mudou alguma das respostas usadas nas recomendações
+                cursor.execute(
+                    f"""
+                        UPDATE respostas r SET resposta = {documento}
+                        FROM (SELECT idUser, resposta AS anterior FROM respostas WHERE idUser = %s FOR UPDATE) a
+                        WHERE r.idUser = a.idUser AND jsonb_array_length(a.anterior) > %s
+                        RETURNING r.resposta,
+                            (r.resposta->0, r.resposta->1, r.resposta->2)
+                            IS DISTINCT FROM (a.anterior->0, a.anterior->1, a.anterior->2)
+                    """,
+                    params
+                )
+                resultado = cursor.fetchone()
+                if resultado is None:
+                    return None
+                if resultado[1]:
+                    PossoAjudarDatabase.atualizar_recomendacoes(cursor, idUser)
+        marcar_escrita(idUser)
+        return resultado[0]
+
+    @staticmethod
+    def update_last_answer(idUser, new_resposta):
+        # Altera a resposta da última pergunta
+        return FormDatabase.update_answers(idUser, alterar=[(-1, new_resposta)]) is not None
@@ -0,0 +1,159 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from os import getpid
+
+from prometheus_client import Counter, Histogram
+
+
+log = logging.getLogger(__name__)
+
+
+GROUP_COMMIT_SIZE = Histogram(
+    'patocash_db_group_commit_size',
+    'Escritas gravadas em cada commit agrupado',
+    ['lote'],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, float('inf'))
+)
+GROUP_COMMIT_SECONDS = Histogram(
+    'patocash_db_group_commit_seconds',
+    'Duracao do comando + commit de cada lote',
+    ['lote']
+)
+GROUP_COMMIT_WAIT = Histogram(
+    'patocash_db_group_commit_wait_seconds',
+    'Tempo entre enfileirar a escrita e o commit dela (latencia vista por quem escreve)',
+    ['lote']
+)
+GROUP_COMMIT_RESULTS = Counter(
+    'patocash_db_group_commit_total',
+    'Escritas processadas pelo commit agrupado, por resultado',
+    ['lote', 'resultado']
+)
+
+
+class GroupCommitTimeout(Exception):
+    """O lote da escrita já estava sendo gravado quando a espera venceu: o resultado é incerto."""
+
+
+class GroupCommit:
+    """
+    Junta escritas concorrentes em um único comando e um único commit.
+
+    Uma thread de escrita por processo espera a primeira escrita, recolhe as
+    que chegarem nos `janela` segundos seguintes (até `max_lote`) e chama
+    `gravar(chave, itens)` uma vez por chave (ex.: o shard do usuário), que
+    grava a lista em uma transação. Enquanto um lote é gravado, os próximos
+    se acumulam na fila e entram todos no commit seguinte.
+
+    Quem escreve espera o commit: `enviar` retorna um Future resolvido só
+    depois do commit (ou com a exceção dele). Se um lote falhar, os itens são
+    gravados de novo um a um, para um registro inválido não derrubar os
+    demais. Com a fila cheia, `enviar` retorna None e quem chamou grava por
+    conta própria; o mesmo vale quando `esperar` vence antes de o lote
+    começar. A thread só é iniciada no primeiro `enviar` (e de novo após um
+    fork).
+    """
+
+    def __init__(self, nome, gravar, janela=0.002, max_lote=200, max_fila=10000, timeout=5.0):
+        self.nome = nome
+        self.gravar = gravar
+        self.janela = janela
+        self.max_lote = max_lote
+        self.timeout = timeout
+        self._fila = queue.Queue(max_fila)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._pid == getpid():
+                return
+            self._pid = getpid()
+            threading.Thread(target=self._escritor, name=f'group-commit-{self.nome}', daemon=True).start()
+
+    def enviar(self, chave, item):
+        """
+        Enfileira `item` para o próximo lote de `chave`. Retorna o Future do
+        commit, ou None se a fila estiver cheia.
+        """
+        if self._pid != getpid():
+            self._iniciar()
+        futuro = Future()
+        try:
+            self._fila.put_nowait((chave, item, futuro, time.monotonic()))
+        except queue.Full:
+            GROUP_COMMIT_RESULTS.labels(self.nome, 'fila_cheia').inc()
+            return None
+        return futuro
+
+    def esperar(self, futuro) -> bool:
+        """
+        Espera o commit de `futuro` por até `timeout` segundos. Retorna True se
+        foi gravado. Se a espera vencer com o item ainda na fila, ele é
+        retirado (não será gravado) e retorna False, para quem chamou gravar
+        por conta própria. Se o lote dele já estava sendo gravado, levanta
+        GroupCommitTimeout.
+        """
+        try:
+            futuro.result(timeout=self.timeout)
+            return True
+        except FutureTimeoutError:
+            if futuro.cancel():
+                GROUP_COMMIT_RESULTS.labels(self.nome, 'expirou').inc()
+                return False
+            GROUP_COMMIT_RESULTS.labels(self.nome, 'incerto').inc()
+            raise GroupCommitTimeout(f"Commit agrupado sem resposta após {self.timeout}s")
+
+    def _recolher(self) -> list:
+        pendentes = [self._fila.get()]
+        limite = time.monotonic() + self.janela
+        while len(pendentes) < self.max_lote:
+            restante = limite - time.monotonic()
+            try:
+                pendentes.append(self._fila.get(timeout=restante) if restante > 0 else self._fila.get_nowait())
+            except queue.Empty:
+                break
+        return pendentes
+
+    def _escritor(self):
+        while True:
+            # Marca cada item como em gravação; os que `esperar` já retirou ficam de fora
+            pendentes = [pendente for pendente in self._recolher() if pendente[2].set_running_or_notify_cancel()]
+            lotes = {}
+            for pendente in pendentes:
+                lotes.setdefault(pendente[0], []).append(pendente)
+            for chave, lote in lotes.items():
+                self._gravar_lote(chave, lote)
+
+    def _gravar_lote(self, chave, lote):
+        inicio = time.monotonic()
+        try:
+            self.gravar(chave, [item for _, item, _, _ in lote])
+        except Exception as e:
+            GROUP_COMMIT_SECONDS.labels(self.nome).observe(time.monotonic() - inicio)
+            if len(lote) == 1:
+                self._concluir(lote, e)
+                return
+            log.warning(
+                "Lote do commit agrupado falhou; gravando um a um",
+                extra={'lote': self.nome, 'itens': len(lote), 'erro': str(e)}
+            )
+            for pendente in lote:
+                self._gravar_lote(chave, [pendente])
+            return
+        GROUP_COMMIT_SECONDS.labels(self.nome).observe(time.monotonic() - inicio)
+        GROUP_COMMIT_SIZE.labels(self.nome).observe(len(lote))
+        self._concluir(lote)
+
+    def _concluir(self, lote, erro=None):
+        agora = time.monotonic()
+        for _, _, futuro, enfileirado_em in lote:
+            GROUP_COMMIT_WAIT.labels(self.nome).observe(agora - enfileirado_em)
+            if erro is None:
+                futuro.set_result(True)
+            else:
+                futuro.set_exception(erro)
+        GROUP_COMMIT_RESULTS.labels(self.nome, 'gravado' if erro is None else 'falhou').inc(len(lote))
@@ -0,0 +1,181 @@
+import logging
+import sys
+import time
+from contextvars import ContextVar
+
+from flask import g, request
+from psycopg2 import extensions
+from prometheus_client import Histogram
+
+from src.database.slow_query import slow_query_log
+
+
+log = logging.getLogger(__name__)
+
+# Exportadas no /metrics pelo PrometheusMetrics do app (registry padrão)
+QUERY_SECONDS = Histogram(
+    'patocash_db_query_seconds',
+    'Duracao de cada comando SQL, pela consulta logica que o executou',
+    ['consulta']
+)
+QUERY_ROWS = Histogram(
+    'patocash_db_query_rows',
+    'Linhas retornadas por comando SQL',
+    ['consulta'],
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000, 10000, float('inf'))
+)
+REQUEST_DB_SECONDS = Histogram(
+    'patocash_request_db_seconds',
+    'Tempo total em banco (espera por conexao + comandos) por requisicao',
+    ['endpoint']
+)
+REQUEST_DB_QUERIES = Histogram(
+    'patocash_request_db_queries',
+    'Comandos SQL executados por requisicao',
+    ['endpoint'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+)
+
+SEM_NOME = 'desconhecida'
+
+# Código de cada método das classes *Database -> nome lógico 'Classe.metodo'
+_nomes = {}
+
+
+def instrumentar(cls):
+    """
+    Decorador de classe: os comandos SQL emitidos pelos métodos de `cls`
+    passam a ser medidos com o nome 'Classe.metodo' do método mais externo
+    da pilha (ex.: get_categorias, mesmo quando ele chama get_dashboard).
+    """
+    for nome, atributo in vars(cls).items():
+        funcao = atributo.__func__ if isinstance(atributo, (staticmethod, classmethod)) else atributo
+        codigo = getattr(funcao, '__code__', None)
+        if codigo is not None:
+            _nomes[codigo] = f"{cls.__name__}.{nome}"
+    return cls
+
+
+def nome_consulta() -> str:
+    """
+    Nome lógico da consulta em andamento, procurado na pilha de chamadas.
+    Custa alguns microssegundos, então é chamado por comando, não por linha.
+    """
+    nome = SEM_NOME
+    frame = sys._getframe(1)
+    while frame is not None:
+        nome = _nomes.get(frame.f_code, nome)
+        frame = frame.f_back
+    return nome
+
+
+class TempoBanco:
+    """Acumulado do tempo em banco de uma requisição."""
+
+    __slots__ = ('consultas', 'execucao', 'espera')
+
+    def __init__(self):
+        self.consultas = 0
+        self.execucao = 0.0
+        self.espera = 0.0
+
+
+_requisicao = ContextVar('patocash_tempo_banco', default=None)
+
+
+def registrar_consulta(consulta, duracao, linhas=-1):
+    QUERY_SECONDS.labels(consulta).observe(duracao)
+    if linhas >= 0:
+        QUERY_ROWS.labels(consulta).observe(linhas)
+    acumulado = _requisicao.get()
+    if acumulado is not None:
+        acumulado.consultas += 1
+        acumulado.execucao += duracao
+
+
+def registrar_espera(duracao):
+    acumulado = _requisicao.get()
+    if acumulado is not None:
+        acumulado.espera += duracao
+
+
+class InstrumentedCursor(extensions.cursor):
+    """
+    Cursor das conexões do pool: mede cada execute/copy_expert e as linhas
+    retornadas, e manda os comandos lentos para o slow query log. `consulta`
+    fixa o nome quando o comando roda fora da pilha de quem o pediu (ex.: o
+    COPY em uma thread).
+    """
+
+    consulta = None
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            resultado = super().execute(query, vars)
+        except Exception:
+            registrar_consulta(self.consulta or nome_consulta(), time.perf_counter() - inicio)
+            raise
+
+        duracao = time.perf_counter() - inicio
+        consulta = self.consulta or nome_consulta()
+        linhas = self.rowcount if self.description is not None else -1
+        registrar_consulta(consulta, duracao, linhas)
+        if duracao >= slow_query_log.limite:
+            try:
+                slow_query_log.registrar(self.connection, consulta, query, vars, duracao, linhas)
+            except Exception as e:
+                # O diagnóstico nunca derruba a consulta que já rodou
+                log.warning("Falha ao registrar consulta lenta: %s", e)
+        return resultado
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            registrar_consulta(self.consulta or nome_consulta(), time.perf_counter() - inicio)
+
+
+class RequestDbMetrics:
+    """
+    Atribui a cada requisição o tempo em banco e a quantidade de comandos:
+    os totais vão para histogramas por endpoint e para o cabeçalho
+    Server-Timing (db = comandos, db-wait = espera por conexão). Em respostas
+    em streaming o cabeçalho só cobre o que rodou antes do primeiro bloco;
+    os histogramas são registrados no fim do streaming.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.iniciar)
+        app.after_request(self.cabecalho)
+        app.teardown_request(self.finalizar)
+
+    def iniciar(self):
+        g.tempo_banco = TempoBanco()
+        _requisicao.set(g.tempo_banco)
+
+    def cabecalho(self, response):
+        acumulado = g.get('tempo_banco')
+        if acumulado is not None:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={acumulado.execucao * 1000:.1f};desc="{acumulado.consultas} consultas", '
+                f'db-wait;dur={acumulado.espera * 1000:.1f}'
+            )
+        return response
+
+    def finalizar(self, exc):
+        acumulado = g.pop('tempo_banco', None)
+        _requisicao.set(None)
+        if acumulado is not None:
+            endpoint = request.endpoint or 'desconhecido'
+            REQUEST_DB_SECONDS.labels(endpoint).observe(acumulado.execucao + acumulado.espera)
+            REQUEST_DB_QUERIES.labels(endpoint).observe(acumulado.consultas)
+
+
+request_db_metrics = RequestDbMetrics()
@@ -0,0 +1,77 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from os import cpu_count, getenv, getpid
+
+import bcrypt
+
+
+class PasswordHasher:
+    """
+    Hash e verificação de senhas com bcrypt, feitos no backend em vez do
+    `crypt(..., gen_salt('bf'))` do pgcrypto, para que o custo de CPU escale
+    com as réplicas e não com o único Postgres.
+
+    O trabalho roda em um pool limitado de threads (o bcrypt libera o GIL).
+    Hashes antigos do pgcrypto (`$2a$`) são verificados normalmente.
+    """
+
+    rounds = int(getenv("BCRYPT_ROUNDS", "10"))
+    workers = int(getenv("PASSWORD_HASH_WORKERS", str(cpu_count() or 2)))
+
+    _executor = None
+    _executor_pid = None
+    _lock = threading.Lock()
+
+    # O bcrypt só usa os primeiros 72 bytes da senha (o crypt() do pgcrypto
+    # trunca em silêncio); o bcrypt >= 5 recusa senhas maiores com ValueError
+    MAX_BYTES = 72
+
+    # Hash usado quando o e-mail não existe, para o login levar o mesmo tempo
+    _hash_ficticio = bcrypt.hashpw(b'patocash', bcrypt.gensalt(rounds)).decode()
+
+    @staticmethod
+    def _pool() -> ThreadPoolExecutor:
+        if PasswordHasher._executor_pid != getpid():
+            with PasswordHasher._lock:
+                if PasswordHasher._executor_pid != getpid():
+                    PasswordHasher._executor = ThreadPoolExecutor(
+                        max_workers=PasswordHasher.workers,
+                        thread_name_prefix='bcrypt'
+                    )
+                    PasswordHasher._executor_pid = getpid()
+        return PasswordHasher._executor
+
+    @staticmethod
+    def _bytes(senha) -> bytes:
+        return senha.encode('utf-8')[:PasswordHasher.MAX_BYTES]
+
+    @staticmethod
+    def hash(senha) -> str:
+        """
+        Gera o hash bcrypt da senha com o custo configurado em BCRYPT_ROUNDS.
+        """
+        salt = bcrypt.gensalt(PasswordHasher.rounds)
+        return PasswordHasher._pool().submit(bcrypt.hashpw, PasswordHasher._bytes(senha), salt).result().decode()
+
+    @staticmethod
+    def verify(senha, senha_hash) -> bool:
+        """
+        Verifica a senha contra um hash bcrypt (gerado aqui ou pelo pgcrypto).
+        Com `senha_hash` None compara com um hash fictício e retorna False.
+        """
+        alvo = senha_hash or PasswordHasher._hash_ficticio
+        try:
+            ok = PasswordHasher._pool().submit(bcrypt.checkpw, PasswordHasher._bytes(senha), alvo.encode()).result()
+        except ValueError:
+            return False
+        return ok and senha_hash is not None
+
+    @staticmethod
+    def needs_rehash(senha_hash) -> bool:
+        """
+        Indica se o hash usa um custo menor que o configurado (ex.: os do pgcrypto, custo 6).
+        """
+        try:
+            return int(senha_hash.split('$')[2]) < PasswordHasher.rounds
+        except (IndexError, ValueError):
+            return True
@@ -1,5 +1,13 @@
-from src.database.db import connection
+import logging
 
+import psycopg2
+
+from src.database.db import connection, shard_de, shards
+from src.database.instrumentation import instrumentar
+
+log = logging.getLogger(__name__)
+
+@instrumentar
 class PossoAjudarDatabase:
     @staticmethod
     def format_posso_ajudar_data(posso_ajudar_tuple):
@@ -9,27 +17,6 @@ class PossoAjudarDatabase:
             'descricao': posso_ajudar_tuple[2]
         }
     
-    @staticmethod
-    def get_all_posso_ajudar():
-        conn = connection()
-        if conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM posso_te_ajudar")
-                results = cursor.fetchall()
-                results = [PossoAjudarDatabase.format_posso_ajudar_data(result) for result in results]
-                return results
-        return []
-    
-    @staticmethod
-    def get_posso_ajudar(id):
-        conn = connection()
-        if conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM posso_te_ajudar WHERE idPossoTeAjudar = %s", (id,))
-                result = cursor.fetchone()
-                return PossoAjudarDatabase.format_posso_ajudar_data(result)
-        return []
-        
     @staticmethod
     def format_ajuda_content_data(ajuda_content_tuple):
         return {
@@ -39,55 +26,139 @@ class PossoAjudarDatabase:
             'modal_cards': ajuda_content_tuple[3]
         }
     
+    # O catálogo (posso_te_ajudar e ajuda_content) é o mesmo em todos os shards,
+    # copiado do principal pelo scripts/rebalancear_shards.py --catalogo; as
+    # leituras dele vão para o principal.
+
     @staticmethod
-    def get_all_ajuda_content(id):
-        conn = connection()
+    def get_catalogo():
+        """
+        Carrega o catálogo inteiro (posso_te_ajudar e ajuda_content) com uma
+        conexão. Sem conexão levanta BancoIndisponivel, para não confundir
+        falha de conexão com catálogo vazio.
+        """
+        conn = connection(leitura=True)
         if conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM ajuda_content WHERE idPossoTeAjudar = %s", (id,))
-                results = cursor.fetchall()
-                results = [PossoAjudarDatabase.format_ajuda_content_data(result) for result in results]
-                return results
-        return []
-    
+                cursor.execute("SELECT * FROM posso_te_ajudar ORDER BY idPossoTeAjudar")
+                posso_ajudar = cursor.fetchall()
+                cursor.execute("SELECT * FROM ajuda_content ORDER BY idAjudaContent")
+                conteudos = cursor.fetchall()
+            conn.close()
+            return (
+                [PossoAjudarDatabase.format_posso_ajudar_data(result) for result in posso_ajudar],
+                [PossoAjudarDatabase.format_ajuda_content_data(result) for result in conteudos],
+            )
+        return None
+
+    @staticmethod
+    def atualizar_recomendacoes(cursor, idUser=None):
+        """
+        Recalcula as recomendações a partir das respostas do questionário e
+        grava em posso_ajudar_recomendado, para um usuário ou para todos.
+        Usa o cursor recebido para rodar na mesma transação de quem chamou.
+
+        Uma renda que não é número (ex.: "R$ 3.000,00" ou vazia) não gera
+        recomendação pela renda. Para um usuário, o recálculo roda em
+        um savepoint: se falhar, as recomendações anteriores ficam e a
+        escrita de quem chamou segue.
+        """
+        if idUser is not None:
+            cursor.execute("SAVEPOINT atualizar_recomendacoes")
+            try:
+                PossoAjudarDatabase._recalcular(cursor, idUser)
+            except psycopg2.Error as e:
+                cursor.execute("ROLLBACK TO SAVEPOINT atualizar_recomendacoes")
+                log.warning("Recomendações não recalculadas", extra={'idUser': idUser, 'erro': str(e)})
+            cursor.execute("RELEASE SAVEPOINT atualizar_recomendacoes")
+            return
+        PossoAjudarDatabase._recalcular(cursor, idUser)
+
+    @staticmethod
+    def _recalcular(cursor, idUser):
+        filtro = "WHERE idUser = %(idUser)s" if idUser is not None else ""
+
+        cursor.execute(f"DELETE FROM posso_ajudar_recomendado {filtro}", {'idUser': idUser})
+        cursor.execute(f"""
+            WITH respostas_texto AS (
+            SELECT
+                idUser,
+                resposta->0->>'resposta' AS objetivo,
+                resposta->1->>'resposta' AS perfil,
+                -- Só converte a renda se for um número simples (vírgula ou ponto
+                -- decimal), para não abortar a transação; fora disso fica NULL
+                CASE
+                WHEN btrim(resposta->2->>'resposta') ~ '^[0-9]+([.,][0-9]+)?$'
+                THEN replace(btrim(resposta->2->>'resposta'), ',', '.')::numeric
+                END AS renda
+            FROM respostas
+            {filtro}
+            ),
+            perfil AS (
+            SELECT
+                idUser,
+                CASE
+                WHEN objetivo = '1' THEN 3 -- Planejar
+                WHEN objetivo = '2' THEN 1 -- Economizar
+                WHEN objetivo = '3' THEN 5 -- Entender
+                END AS objetivo,
+                
+                CASE
+                WHEN perfil = '1' THEN 8 -- Planejamento de aposentadoria (aposentado)
+                WHEN perfil = '2' THEN 9 -- Educação financeira básica (estudante)
+                WHEN perfil = '4' THEN 10 -- Empreender (PJ)
+                WHEN perfil IN ('5', '6') THEN 6 -- Sair das dívidas (negativado)
+                ELSE NULL
+                END AS perfil,
+
+                CASE
+                WHEN renda < 2000 THEN 1 -- Economizar (baixa renda)
+                WHEN renda BETWEEN 2000 AND 6000 THEN 7 -- Construir reserva de emergência
+                WHEN renda > 6000 THEN 2 -- Investir (alta renda)
+                ELSE NULL
+                END AS renda
+            FROM respostas_texto
+            )
+            INSERT INTO posso_ajudar_recomendado (idUser, idPossoTeAjudar)
+            SELECT DISTINCT p.idUser, pa.idPossoTeAjudar
+            FROM perfil p
+            JOIN posso_te_ajudar pa ON pa.idPossoTeAjudar IN (p.objetivo, p.perfil, p.renda)
+            WHERE EXISTS (
+                SELECT 1 FROM ajuda_content ac WHERE ac.idPossoTeAjudar = pa.idPossoTeAjudar
+            );
+        """, {'idUser': idUser})
+
+    @staticmethod
+    def rebuild_recomendacoes(idUser=None):
+        """
+        Recalcula as recomendações gravadas (de todos os usuários ou de `idUser`).
+        """
+        linhas = 0
+        for shard in ([shard_de(idUser)] if idUser is not None else shards()):
+            with connection(shard=shard) as conn:
+                with conn.cursor() as cursor:
+                    PossoAjudarDatabase.atualizar_recomendacoes(cursor, idUser)
+                    linhas += cursor.rowcount
+        return linhas
+
     @staticmethod
     def posso_ajudar_recomendado(id):
-        conn = connection()
+        """
+        Retorna os conteúdos recomendados ao usuário, já calculados quando o
+        questionário foi respondido, em uma única consulta pela chave primária.
+        """
+        conn = connection(leitura=True, idUser=id)
         if conn:
             with conn.cursor() as cursor:
-                cursor.execute(f"""
-                    WITH perfil AS (
-                    SELECT
-                        idUser,
-                        CASE
-                        WHEN (resposta->0->>'resposta') = '1' THEN 3 -- Planejar
-                        WHEN (resposta->0->>'resposta') = '2' THEN 1 -- Economizar
-                        WHEN (resposta->0->>'resposta') = '3' THEN 5 -- Entender
-                        END AS objetivo,
-                        
-                        CASE
-                        WHEN (resposta->1->>'resposta') = '1' THEN 8 -- Planejamento de aposentadoria (aposentado)
-                        WHEN (resposta->1->>'resposta') = '2' THEN 9 -- Educação financeira básica (estudante)
-                        WHEN (resposta->1->>'resposta') = '4' THEN 10 -- Empreender (PJ)
-                        WHEN (resposta->1->>'resposta') IN ('5', '6') THEN 6 -- Sair das dívidas (negativado)
-                        ELSE NULL
-                        END AS perfil,
-
-                        CASE
-                        WHEN (resposta->2->>'resposta')::numeric < 2000 THEN 1 -- Economizar (baixa renda)
-                        WHEN (resposta->2->>'resposta')::numeric BETWEEN 2000 AND 6000 THEN 7 -- Construir reserva de emergência
-                        WHEN (resposta->2->>'resposta')::numeric > 6000 THEN 2 -- Investir (alta renda)
-                        ELSE NULL
-                        END AS renda
-                    FROM respostas
-                    WHERE idUser = {id}
-                    )
-                    SELECT DISTINCT ac.idpossoteajudar
-                    FROM perfil p
-                    JOIN posso_te_ajudar pa ON pa.idpossoteajudar IN (p.objetivo, p.perfil, p.renda)
-                    JOIN ajuda_content ac ON ac.idPossoTeAjudar = pa.idpossoteajudar;
-                """)
+                cursor.execute("""
+                    SELECT pa.*
+                    FROM posso_ajudar_recomendado r
+                    JOIN posso_te_ajudar pa ON pa.idPossoTeAjudar = r.idPossoTeAjudar
+                    WHERE r.idUser = %s
+                    ORDER BY pa.idPossoTeAjudar;
+                """, (id,))
                 results = cursor.fetchall()
-                results = [id for (id,) in results]
-                return results
-        return []
\ No newline at end of file
+            conn.close()
+            results = [PossoAjudarDatabase.format_posso_ajudar_data(result) for result in results]
+            return results
+        return []
@@ -0,0 +1,163 @@
+import itertools
+import logging
+import threading
+import time
+
+import psycopg2
+from prometheus_client import Counter, Gauge
+
+
+log = logging.getLogger(__name__)
+
+REPLICA_LAG = Gauge(
+    'patocash_db_replica_lag_seconds',
+    'Atraso de replicacao medido na ultima verificacao da replica',
+    ['replica'],
+    multiprocess_mode='max'
+)
+REPLICA_HEALTHY = Gauge(
+    'patocash_db_replica_healthy',
+    'Replica disponivel para leituras (1) ou fora de rotacao (0)',
+    ['replica'],
+    multiprocess_mode='min'
+)
+DB_ROUTES = Counter(
+    'patocash_db_routes_total',
+    'Conexoes entregues por shard, destino e motivo da escolha',
+    ['shard', 'destino', 'motivo']
+)
+
+# Atraso zero quando a réplica já aplicou tudo o que recebeu: sem isso um
+# primário ocioso (sem transações novas) pareceria uma réplica atrasada
+SQL_ATRASO = '''
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+'''
+
+
+class Replica:
+    """Pool de uma réplica e o resultado da última verificação de saúde."""
+
+    def __init__(self, nome, pool):
+        self.nome = nome
+        self.pool = pool
+        self.saudavel = True
+        self.atraso = 0.0
+        self.verificada_em = float('-inf')
+        self.lock = threading.Lock()
+
+
+class ReplicaSet:
+    """
+    Escolhe a conexão de cada leitura entre as réplicas saudáveis (em rodízio)
+    e o primário.
+
+    Uma réplica sai de rotação quando a verificação falha ou o atraso passa
+    de `max_atraso` segundos; a verificação roda a cada `intervalo` segundos,
+    por uma única thread, no momento em que a réplica seria escolhida.
+
+    Depois de uma escrita de um usuário, as leituras dele vão para o primário
+    por `janela` segundos (read-your-writes). O registro das escritas é local
+    ao processo: escolha `janela` maior que o atraso típico das réplicas.
+    """
+
+    def __init__(self, primario, replicas, janela, max_atraso, intervalo, shard='shard0'):
+        self.shard = shard
+        self.primario = primario
+        self.replicas = replicas
+        self.janela = janela
+        self.max_atraso = max_atraso
+        self.intervalo = intervalo
+        self._rodizio = itertools.count()
+        self._escritas = {}
+        self._escritas_lock = threading.Lock()
+        for replica in replicas:
+            REPLICA_HEALTHY.labels(replica.nome).set(1)
+
+    def marcar_escrita(self, idUser):
+        if idUser is None or not self.replicas:
+            return
+        agora = time.monotonic()
+        with self._escritas_lock:
+            self._escritas[int(idUser)] = agora + self.janela
+            if len(self._escritas) > 10000:
+                self._escritas = {id: ate for id, ate in self._escritas.items() if ate > agora}
+
+    def escreveu_recentemente(self, idUser) -> bool:
+        if idUser is None:
+            return False
+        ate = self._escritas.get(int(idUser))
+        return ate is not None and ate > time.monotonic()
+
+    def verificar(self, replica):
+        """
+        Mede o atraso da réplica, se a última verificação já venceu. Enquanto
+        outra thread verifica, vale o resultado anterior.
+        """
+        if time.monotonic() - replica.verificada_em < self.intervalo:
+            return
+        if not replica.lock.acquire(blocking=False):
+            return
+        try:
+            try:
+                conn = replica.pool.acquire(timeout=1)
+            except Exception as e:
+                self._resultado(replica, False, None, e)
+                return
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(SQL_ATRASO)
+                    atraso = float(cursor.fetchone()[0])
+                conn.rollback()
+                self._resultado(replica, atraso <= self.max_atraso, atraso)
+            except psycopg2.Error as e:
+                self._resultado(replica, False, None, e)
+            finally:
+                replica.pool.release(conn)
+        finally:
+            replica.lock.release()
+
+    def _resultado(self, replica, saudavel, atraso, erro=None):
+        if replica.saudavel and not saudavel:
+            log.warning(
+                "Réplica fora de rotação", extra={'replica': replica.nome, 'atraso': atraso, 'erro': str(erro or '')}
+            )
+        replica.saudavel = saudavel
+        replica.verificada_em = time.monotonic()
+        REPLICA_HEALTHY.labels(replica.nome).set(1 if saudavel else 0)
+        if atraso is not None:
+            replica.atraso = atraso
+            REPLICA_LAG.labels(replica.nome).set(atraso)
+
+    def falhou(self, replica, erro):
+        """Tira a réplica de rotação até a próxima verificação."""
+        self._resultado(replica, False, None, erro)
+
+    def escolher(self, leitura, idUser=None):
+        """
+        Retorna (pool, replica ou None) para a próxima conexão. Escritas e
+        leituras dentro da janela de read-your-writes vão para o primário.
+        """
+        if not leitura:
+            DB_ROUTES.labels(self.shard, 'primary', 'escrita').inc()
+            return self.primario, None
+        if not self.replicas:
+            DB_ROUTES.labels(self.shard, 'primary', 'sem_replicas').inc()
+            return self.primario, None
+        if self.escreveu_recentemente(idUser):
+            DB_ROUTES.labels(self.shard, 'primary', 'read_your_writes').inc()
+            return self.primario, None
+
+        inicio = next(self._rodizio)
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(inicio + i) % len(self.replicas)]
+            self.verificar(replica)
+            if replica.saudavel:
+                DB_ROUTES.labels(self.shard, replica.nome, 'leitura').inc()
+                return replica.pool, replica
+
+        DB_ROUTES.labels(self.shard, 'primary', 'replicas_indisponiveis').inc()
+        return self.primario, None
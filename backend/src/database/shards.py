@@ -0,0 +1,54 @@
+import bisect
+import hashlib
+
+
+def _posicao(texto) -> int:
+    return int.from_bytes(hashlib.sha1(texto.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing:
+    """
+    Anel de hash consistente: cada shard ocupa `vnodes` posições e a chave vai
+    para o primeiro shard no sentido horário. Incluir ou remover um shard
+    move só as chaves vizinhas às posições dele (~1/N dos usuários).
+    """
+
+    def __init__(self, nomes, vnodes=128):
+        if not nomes:
+            raise ValueError("o anel precisa de pelo menos um shard")
+        pontos = sorted((_posicao(f"{nome}#{i}"), nome) for nome in nomes for i in range(vnodes))
+        self._posicoes = [posicao for posicao, _ in pontos]
+        self._nomes = [nome for _, nome in pontos]
+
+    def shard(self, chave) -> str:
+        indice = bisect.bisect(self._posicoes, _posicao(str(chave))) % len(self._posicoes)
+        return self._nomes[indice]
+
+
+class ShardRouter:
+    """
+    Mapeia cada idUser para um shard (um PostgreSQL com o schema completo do
+    init.sql) pelo HashRing, e cada shard para o seu ReplicaSet.
+
+    O shard `principal` também guarda o que não é de um usuário: o diretório
+    global de usuários (ids e e-mails) e a cópia mestre do catálogo.
+    """
+
+    def __init__(self, shards, principal='shard0', vnodes=128):
+        if principal not in shards:
+            raise ValueError(f"shard principal {principal!r} não configurado")
+        self.shards = shards
+        self.principal = principal
+        self.ring = HashRing(list(shards), vnodes)
+
+    @property
+    def nomes(self) -> list:
+        return list(self.shards)
+
+    def shard_de(self, idUser) -> str:
+        if len(self.shards) == 1:
+            return self.principal
+        return self.ring.shard(int(idUser))
+
+    def replicas(self, shard=None):
+        return self.shards[shard or self.principal]
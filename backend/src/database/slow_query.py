@@ -0,0 +1,154 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from os import getenv
+
+import psycopg2
+from psycopg2 import extensions
+from prometheus_client import Counter
+
+
+log = logging.getLogger(__name__)
+
+SLOW_QUERIES = Counter(
+    'patocash_db_slow_queries_total',
+    'Comandos SQL acima do limite do slow query log',
+    ['consulta']
+)
+
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_ESPACOS = re.compile(r'\s+')
+_EXPLICAVEIS = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'EXECUTE')
+
+# Nome de cada comando preparado -> SQL original (registrado por PreparedStatement)
+_textos_preparados = {}
+
+
+def registrar_preparado(nome, sql):
+    _textos_preparados[nome] = sql
+
+
+def fingerprint(sql) -> str:
+    """
+    SQL normalizado (espaços colapsados, literais trocados por ?) que identifica
+    o comando independente dos valores. EXECUTE de um comando preparado vira
+    o SQL com que ele foi preparado.
+    """
+    if sql.startswith('EXECUTE '):
+        sql = _textos_preparados.get(sql.split(None, 2)[1], sql)
+    return _ESPACOS.sub(' ', _LITERAIS.sub('?', sql)).strip()
+
+
+def formato_parametros(params):
+    """
+    Tipos dos parâmetros, sem os valores (que podem ter dados pessoais).
+    """
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {chave: type(valor).__name__ for chave, valor in params.items()}
+    return [type(valor).__name__ for valor in params]
+
+
+class SlowQueryLog:
+    """
+    Registro dos comandos que passam de `limite_ms`. Cada ocorrência conta na
+    métrica `patocash_db_slow_queries_total`; no máximo uma amostra por
+    fingerprint a cada `intervalo` segundos é guardada, com o plano do
+    EXPLAIN (FORMAT JSON, sem ANALYZE), em um buffer circular de
+    `capacidade` entradas. O buffer é local ao processo.
+    """
+
+    def __init__(self, limite_ms, capacidade, intervalo):
+        self.limite = limite_ms / 1000 if limite_ms > 0 else float('inf')
+        self.intervalo = intervalo
+        self._amostras = deque(maxlen=capacidade)
+        self._ultima_amostra = {}
+        self._lock = threading.Lock()
+
+    def registrar(self, conn, consulta, sql, params, duracao, linhas):
+        SLOW_QUERIES.labels(consulta).inc()
+
+        if isinstance(sql, bytes):
+            sql = sql.decode(extensions.encodings[conn.encoding])
+        texto = fingerprint(sql)
+        id = hashlib.sha1(texto.encode('utf-8')).hexdigest()[:16]
+
+        agora = time.monotonic()
+        with self._lock:
+            if agora - self._ultima_amostra.get(id, -self.intervalo) < self.intervalo:
+                return
+            self._ultima_amostra[id] = agora
+            # Mantém o controle de frequência só para fingerprints recentes
+            if len(self._ultima_amostra) > 4 * self._amostras.maxlen:
+                self._ultima_amostra = {
+                    chave: quando for chave, quando in self._ultima_amostra.items()
+                    if agora - quando < self.intervalo
+                }
+
+        self._amostras.append({
+            'id': id,
+            'consulta': consulta,
+            'fingerprint': texto,
+            'parametros': formato_parametros(params),
+            'duracao_ms': round(duracao * 1000, 1),
+            'linhas': linhas,
+            'quando': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'plano': self.explain(conn, sql, params),
+        })
+
+    @staticmethod
+    def explain(conn, sql, params):
+        """
+        Plano do comando, obtido na mesma conexão (e transação) dentro de um
+        savepoint, para que uma falha no EXPLAIN não aborte a transação de
+        quem executou a consulta. Nunca levanta: o erro vira o plano da amostra.
+        """
+        if not sql.lstrip().upper().startswith(_EXPLICAVEIS):
+            return None
+        em_transacao = conn.info.transaction_status == extensions.TRANSACTION_STATUS_INTRANS
+        # Cursor comum: o EXPLAIN não entra nas métricas nem no próprio slow query log
+        savepoint = False
+        try:
+            with extensions.cursor(conn) as cursor:
+                try:
+                    if em_transacao:
+                        cursor.execute('SAVEPOINT slow_query_explain')
+                        savepoint = True
+                    cursor.execute('EXPLAIN (ANALYZE OFF, FORMAT JSON) ' + sql, params)
+                    plano = cursor.fetchone()[0]
+                    if savepoint:
+                        cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+                    return plano
+                except Exception as e:
+                    if savepoint:
+                        try:
+                            cursor.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                            cursor.execute('RELEASE SAVEPOINT slow_query_explain')
+                        except psycopg2.Error as erro_rollback:
+                            # Conexão perdida ou transação já abortada: quem consultou verá o próprio erro
+                            log.warning("Falha ao desfazer o savepoint do EXPLAIN: %s", erro_rollback)
+                    return {'erro': str(e).strip()}
+        except Exception as e:
+            log.warning("Falha ao obter o plano da consulta lenta: %s", e)
+            return {'erro': str(e).strip()}
+
+    def amostras(self) -> list:
+        """Amostras guardadas, da mais recente para a mais antiga."""
+        return list(reversed(self._amostras))
+
+    def limpar(self):
+        with self._lock:
+            self._amostras.clear()
+            self._ultima_amostra.clear()
+
+
+slow_query_log = SlowQueryLog(
+    limite_ms=float(getenv("SLOW_QUERY_MS", "200")),
+    capacidade=int(getenv("SLOW_QUERY_BUFFER", "100")),
+    intervalo=float(getenv("SLOW_QUERY_SAMPLE_INTERVAL", "60")),
+)
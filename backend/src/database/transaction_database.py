@@ -1,278 +1,662 @@
-from src.database.db import connection
+import csv
+import io
+import time
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from os import getenv
+from psycopg2.extras import execute_values
+from src.database.db import BancoIndisponivel, connection, copy_to_iter, execute_prepared, marcar_escrita, shard_de, shards, IterableReader
+from src.database.group_commit import GroupCommit, GroupCommitTimeout
+from src.database.instrumentation import instrumentar, registrar_espera
+from src.cache.response_cache import analytics_cache
 
+@instrumentar
 class TransactionDatabase:
 
+    @staticmethod
+    def intervalo_mes(mes):
+        """
+        Converte 'YYYY-MM' no intervalo semiaberto [primeiro dia, primeiro dia
+        do mês seguinte), que pode ser atendido pelo índice (idUser, data).
+        """
+        ano, mes = (int(parte) for parte in mes.split('-'))
+        inicio = date(ano, mes, 1)
+        fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+        return inicio, fim
+
+    CAMPOS_TRANSACAO = ("idTransaction", "idUser", "estabelecimento", "categoria", "valor", "data")
+
     @staticmethod
     def format_transaction(transaction_tuple):
-        return {
-            "idTransaction": transaction_tuple[0],
-            "idUser": transaction_tuple[1],
-            "estabelecimento": transaction_tuple[2],
-            "categoria": transaction_tuple[3],
-            "valor": float(transaction_tuple[4]),
-            "data": transaction_tuple[5].strftime("%d/%m/%Y")
-        }
+        # valor e data já chegam formatados pelo SELECT de filtros_transacoes
+        return dict(zip(TransactionDatabase.CAMPOS_TRANSACAO, transaction_tuple))
     
     @staticmethod
-    def get_all_transactions(idUser, mes=None, categoria=None) -> tuple:
-        conn = connection()
-        if conn:
-            query = '''
-                SELECT * FROM transactions 
-                WHERE idUser = %s
-            '''
-            params = [idUser]
+    def format_columnar(rows) -> dict:
+        """
+        Converte as linhas em colunas paralelas (sem idUser, que é o próprio
+        filtro). As categorias são codificadas por dicionário: a coluna
+        `categoria` guarda o índice do nome em `categorias`.
+        """
+        colunas = {"idTransaction": [], "estabelecimento": [], "categoria": [], "valor": [], "data": []}
+        indices = {}
+        idTransaction, estabelecimento, categoria, valor, data = colunas.values()
+        for row in rows:
+            idTransaction.append(row[0])
+            estabelecimento.append(row[2])
+            indice = indices.get(row[3])
+            if indice is None:
+                indice = indices[row[3]] = len(indices)
+            categoria.append(indice)
+            valor.append(row[4])
+            data.append(row[5])
+        colunas["categorias"] = list(indices)
+        colunas["total"] = len(idTransaction)
+        return colunas
 
-            if mes and mes != 'todos':
-                query += " AND TO_CHAR(data, 'YYYY-MM') = %s"
-                params.append(mes)
+    @staticmethod
+    def filtros_transacoes(idUser, mes=None, categoria=None) -> tuple:
+        """
+        Monta o SELECT filtrado (e seus parâmetros) da listagem de transações do usuário.
+        """
+        # valor como float8 e data como texto DD/MM/YYYY saem prontos para o JSON
+        query = '''
+            SELECT idTransaction, idUser, estabelecimento, categoria,
+                   valor::float8, to_char(data, 'DD/MM/YYYY')
+            FROM transactions 
+            WHERE idUser = %s
+        '''
+        params = [idUser]
 
-            # Aplicar filtro de categoria, se fornecido
-            if categoria and categoria != 'todas':
-                query += " AND categoria = %s"
-                params.append(categoria)
+        if mes and mes != 'todos':
+            query += " AND data >= %s AND data < %s"
+            params.extend(TransactionDatabase.intervalo_mes(mes))
+
+        # Aplicar filtro de categoria, se fornecido
+        if categoria and categoria != 'todas':
+            query += " AND categoria = %s"
+            params.append(categoria)
+
+        return query, params
+
+    @staticmethod
+    def get_all_transactions(idUser, mes=None, categoria=None) -> list:
+        conn = connection(leitura=True, idUser=idUser)
+        if conn:
+            query, params = TransactionDatabase.filtros_transacoes(idUser, mes, categoria)
 
             # Ordenar por data, do mais recente para o mais antigo
-            query += " ORDER BY data DESC"
+            query += " ORDER BY data DESC, idTransaction DESC"
 
+            # Cada combinação de filtros vira um comando preparado próprio
             with conn.cursor() as cursor:
-                cursor.execute(query, tuple(params))
+                execute_prepared(cursor, query, tuple(params))
                 transactions = cursor.fetchall()
                 transactions = [TransactionDatabase.format_transaction(row) for row in transactions]
 
             conn.close()
             return transactions
-    
+        return []
+
+    @staticmethod
+    def get_transactions_page(idUser, limit, after=None, mes=None, categoria=None, colunar=False) -> tuple:
+        """
+        Retorna uma página de transações (mais recentes primeiro) e o cursor da
+        próxima página, ou None se esta for a última. Com `colunar` a página
+        vem no formato de `format_columnar`.
+
+        A paginação é por keyset em (data, idTransaction): `after` é o cursor
+        devolvido pela página anterior, no formato 'YYYY-MM-DD_idTransaction'.
+        """
+        query, params = TransactionDatabase.filtros_transacoes(idUser, mes, categoria)
+
+        if after:
+            data, idTransaction = after.split('_')
+            query += " AND (data, idTransaction) < (%s, %s)"
+            params.extend([date.fromisoformat(data), int(idTransaction)])
+
+        # Busca um registro a mais para saber se existe próxima página
+        query += " ORDER BY data DESC, idTransaction DESC LIMIT %s"
+        params.append(limit + 1)
+
+        with connection(leitura=True, idUser=idUser) as conn:
+            with conn.cursor() as cursor:
+                execute_prepared(cursor, query, tuple(params))
+                rows = cursor.fetchall()
+
+        proximo = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            dia, mes_cursor, ano = rows[-1][5].split('/')
+            proximo = f"{ano}-{mes_cursor}-{dia}_{rows[-1][0]}"
+
+        if colunar:
+            return TransactionDatabase.format_columnar(rows), proximo
+        return [TransactionDatabase.format_transaction(row) for row in rows], proximo
+
+    @staticmethod
+    def iter_transactions(idUser, mes=None, categoria=None, itersize=2000):
+        """
+        Gera as transações do usuário uma a uma a partir de um cursor nomeado
+        (server-side), buscando `itersize` linhas por vez. A conexão fica
+        emprestada até o gerador terminar ou ser fechado.
+
+        Os filtros (ValueError) e a conexão (BancoIndisponivel) são resolvidos
+        já na chamada, e não no primeiro `next`: quem responde em streaming
+        ainda pode devolver 400 ou 503.
+        """
+        query, params = TransactionDatabase.filtros_transacoes(idUser, mes, categoria)
+        query += " ORDER BY data DESC, idTransaction DESC"
+        conn = connection(leitura=True, idUser=idUser)
+        return TransactionDatabase._iter_cursor(conn, query, tuple(params), itersize)
+
+    @staticmethod
+    def _iter_cursor(conn, query, params, itersize):
+        with conn:
+            with conn.cursor(name='transacoes_stream') as cursor:
+                # Mesmo nome nas métricas de antes, quando o gerador era o próprio iter_transactions
+                cursor.consulta = 'TransactionDatabase.iter_transactions'
+                cursor.itersize = itersize
+                cursor.execute(query, params)
+                for row in cursor:
+                    yield TransactionDatabase.format_transaction(row)
+
+    @staticmethod
+    def get_transactions_columnar(idUser, mes=None, categoria=None, itersize=2000) -> dict:
+        """
+        Histórico completo no formato de `format_columnar`, lido pelo mesmo
+        cursor nomeado do streaming para não manter as tuplas em memória.
+        """
+        query, params = TransactionDatabase.filtros_transacoes(idUser, mes, categoria)
+        query += " ORDER BY data DESC, idTransaction DESC"
+
+        with connection(leitura=True, idUser=idUser) as conn:
+            with conn.cursor(name='transacoes_colunar') as cursor:
+                cursor.itersize = itersize
+                cursor.execute(query, tuple(params))
+                return TransactionDatabase.format_columnar(cursor)
+
+    @staticmethod
+    def export_transactions(idUser, formato='csv', de=None, ate=None, categoria=None):
+        """
+        Gera a exportação das transações do usuário em blocos de bytes, direto
+        da saída de um COPY (csv com cabeçalho ou JSON Lines), sem formatar
+        linha a linha em Python. `de` e `ate` (YYYY-MM-DD) são inclusivos.
+        """
+        # Alias entre aspas: sem elas o Postgres devolve "idtransaction" no
+        # cabeçalho do csv e nas chaves do row_to_json, e não o nome da API
+        query = '''
+            SELECT idTransaction AS "idTransaction", estabelecimento, categoria, valor, data
+            FROM transactions
+            WHERE idUser = %s
+        '''
+        params = [idUser]
+
+        if de:
+            query += " AND data >= %s"
+            params.append(date.fromisoformat(de))
+        if ate:
+            query += " AND data <= %s"
+            params.append(date.fromisoformat(ate))
+        if categoria and categoria != 'todas':
+            query += " AND categoria = %s"
+            params.append(categoria)
+
+        query += " ORDER BY data DESC, idTransaction DESC"
+
+        if formato == 'jsonl':
+            # QUOTE/DELIMITER em caracteres de controle fazem o COPY emitir o JSON sem escapes extras
+            sql = f"COPY (SELECT row_to_json(t) FROM ({query}) t) TO STDOUT WITH (FORMAT csv, QUOTE E'\\x01', DELIMITER E'\\x02')"
+        else:
+            sql = f"COPY ({query}) TO STDOUT WITH (FORMAT csv, HEADER)"
+
+        return copy_to_iter(sql, tuple(params), leitura=True, idUser=idUser)
+
+    # Advisory locks do resumo mensal (por shard): (LOCK_RESUMO, 0) cobre a
+    # tabela toda e (LOCK_RESUMO, idUser) o resumo de um usuário. Quem soma ao
+    # resumo pega os dois compartilhados; rebuild_resumo_mensal pega o
+    # exclusivo, para o DELETE + INSERT não cruzar com essas somas.
+    LOCK_RESUMO = 7001
+
+    @staticmethod
+    def travar_resumo(cursor, idUsers):
+        """
+        Pega, até o fim da transação, os locks compartilhados do resumo mensal
+        dos usuários `idUsers`. Deve vir antes de somar ao resumo.
+        """
+        cursor.execute(
+            '''
+                SELECT pg_advisory_xact_lock_shared(%s, 0);
+                SELECT pg_advisory_xact_lock_shared(%s, u) FROM unnest(%s::int[]) u;
+            ''',
+            (TransactionDatabase.LOCK_RESUMO, TransactionDatabase.LOCK_RESUMO, sorted(set(idUsers)))
+        )
+
     @staticmethod
     def insert_transaction(idUser, estabelecimento, categoria, valor, data):
         """
-        Insere uma nova transação na tabela transactions e retorna o id da transação inserida.
+        Insere uma nova transação na tabela transactions e atualiza o resumo
+        mensal do usuário no mesmo comando (e portanto no mesmo commit).
+
+        Com o commit agrupado ligado (DB_GROUP_COMMIT), a transação entra no
+        próximo lote de `transaction_commits` e a chamada só retorna depois
+        do commit dele. Se o lote não sair em DB_GROUP_COMMIT_TIMEOUT segundos,
+        a transação é gravada aqui mesmo; se o lote já estava no banco, não há
+        como saber se gravou e a chamada levanta BancoIndisponivel (503).
         """
-        conn = connection()
+        if transaction_commits is not None:
+            inicio = time.perf_counter()
+            futuro = transaction_commits.enviar(shard_de(idUser), (idUser, estabelecimento, categoria, valor, data))
+            if futuro is not None:
+                try:
+                    gravado = transaction_commits.esperar(futuro)
+                except GroupCommitTimeout as e:
+                    raise BancoIndisponivel(str(e)) from e
+                finally:
+                    registrar_espera(time.perf_counter() - inicio)
+                if gravado:
+                    marcar_escrita(idUser)
+                    analytics_cache.invalidate_user(idUser)
+                    return
+
+        conn = connection(idUser=idUser)
         if conn:
             with conn.cursor() as cursor:
+                TransactionDatabase.travar_resumo(cursor, [idUser])
                 cursor.execute(
                     '''
-                        INSERT INTO 
-                        transactions (idUser, estabelecimento, categoria, valor, data) 
-                        VALUES (%s, %s, %s, %s, %s);
+                        WITH nova AS (
+                            INSERT INTO 
+                            transactions (idUser, estabelecimento, categoria, valor, data) 
+                            VALUES (%s, %s, %s, %s, %s)
+                            RETURNING idUser, data, categoria, valor
+                        )
+                        INSERT INTO transactions_resumo_mensal (idUser, mes, categoria, total, quantidade)
+                        SELECT idUser, date_trunc('month', data)::date, categoria, valor, 1
+                        FROM nova
+                        ON CONFLICT (idUser, mes, categoria) DO UPDATE
+                        SET total = transactions_resumo_mensal.total + EXCLUDED.total,
+                            quantidade = transactions_resumo_mensal.quantidade + EXCLUDED.quantidade;
                     ''',
                     (idUser, estabelecimento, categoria, valor, data)
                 )
                 conn.commit()
             conn.close()
-    
+            marcar_escrita(idUser)
+            analytics_cache.invalidate_user(idUser)
+
     @staticmethod
-    def get_lest_transactions_mes(idUser) -> dict:
+    def gravar_lote(shard, transacoes):
         """
-        Retorna as últimas transações do usuário dos últimos 5 meses, agrupadas por mês.
-        """       
-        query = '''
-            SELECT 
-                TO_CHAR(data, 'Mon/YY') AS mes_ano,
-                SUM(valor) AS total_valor,
-                MAX(data) AS ultima_transacao
-            FROM transactions 
-            WHERE idUser = %s
-            AND data >= NOW() - INTERVAL '5 months'
-            GROUP BY mes_ano;
-        '''
+        Grava (idUser, estabelecimento, categoria, valor, data) de vários
+        usuários do mesmo shard em um INSERT de várias linhas, com o resumo
+        mensal atualizado no mesmo comando, e um único commit.
+        """
+        conn = connection(shard=shard)
+        with conn:
+            with conn.cursor() as cursor:
+                TransactionDatabase.travar_resumo(cursor, [transacao[0] for transacao in transacoes])
+                execute_values(
+                    cursor,
+                    '''
+                        WITH novas AS (
+                            INSERT INTO transactions (idUser, estabelecimento, categoria, valor, data)
+                            VALUES %s
+                            RETURNING idUser, data, categoria, valor
+                        )
+                        INSERT INTO transactions_resumo_mensal (idUser, mes, categoria, total, quantidade)
+                        SELECT idUser, date_trunc('month', data)::date, categoria, SUM(valor), COUNT(*)
+                        FROM novas
+                        GROUP BY 1, 2, 3
+                        ON CONFLICT (idUser, mes, categoria) DO UPDATE
+                        SET total = transactions_resumo_mensal.total + EXCLUDED.total,
+                            quantidade = transactions_resumo_mensal.quantidade + EXCLUDED.quantidade;
+                    ''',
+                    transacoes,
+                    page_size=len(transacoes)
+                )
+
+    @staticmethod
+    def validar_transacao(dados) -> tuple:
+        """
+        Valida um registro de importação e devolve (estabelecimento, categoria,
+        valor, data) prontos para gravação. Levanta ValueError se inválido.
+        """
+        if not isinstance(dados, dict):
+            raise ValueError("registro não é um objeto com os campos da transação")
 
-        resultado_final = {}
-        with connection() as conn:
+        estabelecimento = str(dados.get('estabelecimento') or '').strip()
+        categoria = str(dados.get('categoria') or '').strip()
+        if not estabelecimento or len(estabelecimento) > 255:
+            raise ValueError("estabelecimento vazio ou com mais de 255 caracteres")
+        if not categoria or len(categoria) > 255:
+            raise ValueError("categoria vazia ou com mais de 255 caracteres")
+
+        try:
+            valor = Decimal(str(dados.get('valor')).strip()).quantize(Decimal('0.01'))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f"valor inválido: {dados.get('valor')!r}")
+        if not valor.is_finite() or abs(valor) >= Decimal('100000000'):
+            raise ValueError(f"valor fora do intervalo: {dados.get('valor')!r}")
+
+        texto_data = str(dados.get('data') or '').strip()
+        for formato in ('%Y-%m-%d', '%d/%m/%Y'):
+            try:
+                data = datetime.strptime(texto_data, formato).date()
+                break
+            except ValueError:
+                continue
+        else:
+            raise ValueError(f"data inválida (use YYYY-MM-DD ou DD/MM/YYYY): {texto_data!r}")
+
+        return estabelecimento, categoria, valor, data
+
+    @staticmethod
+    def import_transactions(idUser, registros, max_erros=100) -> dict:
+        """
+        Importa transações em lote com COPY ... FROM STDIN, em uma transação.
+
+        `registros` é um iterável de (número da linha, dict) consumido sob
+        demanda: cada registro é validado e, se válido, enviado ao COPY; os
+        inválidos são apenas relatados (até `max_erros`). O resumo mensal é
+        atualizado uma vez para o lote inteiro e o cache é invalidado uma vez.
+
+        Se o próprio arquivo não puder ser lido (CSV malformado, bytes que não
+        são UTF-8), nada é importado e levanta ValueError.
+        """
+        resultado = {'importadas': 0, 'total_erros': 0, 'erros': []}
+        # Erro de leitura do arquivo: o psycopg2 trocaria uma exceção levantada
+        # dentro do read() do COPY por QueryCanceledError, então ela é guardada
+        # aqui, o COPY termina e o erro é levantado depois dele
+        falha_leitura = []
+
+        def blocos_csv(tamanho_bloco=65536):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            try:
+                for numero, dados in registros:
+                    try:
+                        writer.writerow(TransactionDatabase.validar_transacao(dados))
+                        resultado['importadas'] += 1
+                    except ValueError as e:
+                        resultado['total_erros'] += 1
+                        if len(resultado['erros']) < max_erros:
+                            resultado['erros'].append({'linha': numero, 'erro': str(e)})
+                    if buffer.tell() >= tamanho_bloco:
+                        yield buffer.getvalue()
+                        buffer.seek(0)
+                        buffer.truncate()
+            except (csv.Error, UnicodeDecodeError) as e:
+                falha_leitura.append(e)
+                return
+            yield buffer.getvalue()
+
+        with connection(idUser=idUser) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,))
-                resultado = cursor.fetchall()
-                resultado = sorted(resultado, key=lambda x: x[2], reverse=False)
-                resultado_final = {
-                    mes_ano: float(total_valor) for mes_ano, total_valor, _ in resultado
-                }
-        return resultado_final 
+                cursor.execute(
+                    '''
+                        CREATE TEMP TABLE transactions_importacao (
+                            estabelecimento VARCHAR(255) NOT NULL,
+                            categoria VARCHAR(255) NOT NULL,
+                            valor DECIMAL(10, 2) NOT NULL,
+                            data DATE NOT NULL
+                        ) ON COMMIT DROP;
+                    '''
+                )
+                cursor.copy_expert(
+                    '''
+                        COPY transactions_importacao (estabelecimento, categoria, valor, data)
+                        FROM STDIN WITH (FORMAT csv)
+                    ''',
+                    IterableReader(blocos_csv())
+                )
+                if falha_leitura:
+                    # Sai do `with` com exceção: a transação (e a tabela temporária) é desfeita
+                    raise ValueError(f"Arquivo inválido: {falha_leitura[0]}")
+                if resultado['importadas']:
+                    TransactionDatabase.travar_resumo(cursor, [idUser])
+                    cursor.execute(
+                        '''
+                            WITH novas AS (
+                                INSERT INTO transactions (idUser, estabelecimento, categoria, valor, data)
+                                SELECT %s, estabelecimento, categoria, valor, data
+                                FROM transactions_importacao
+                                RETURNING idUser, data, categoria, valor
+                            )
+                            INSERT INTO transactions_resumo_mensal (idUser, mes, categoria, total, quantidade)
+                            SELECT idUser, date_trunc('month', data)::date, categoria, SUM(valor), COUNT(*)
+                            FROM novas
+                            GROUP BY 1, 2, 3
+                            ON CONFLICT (idUser, mes, categoria) DO UPDATE
+                            SET total = transactions_resumo_mensal.total + EXCLUDED.total,
+                                quantidade = transactions_resumo_mensal.quantidade + EXCLUDED.quantidade;
+                        ''',
+                        (idUser,)
+                    )
+
+        if resultado['importadas']:
+            marcar_escrita(idUser)
+            analytics_cache.invalidate_user(idUser)
+        return resultado
 
     @staticmethod
-    def get_lest_transactions_mes_categoria(idUser) -> list:
-        
+    def rebuild_resumo_mensal(idUser=None):
+        """
+        Recalcula o resumo mensal a partir de transactions, de todos os
+        usuários ou apenas de `idUser`, em uma transação por shard.
+
+        Pega o advisory lock exclusivo do resumo (do usuário, ou da tabela
+        toda), então inserções e importações concorrentes esperam o fim da
+        reconstrução em vez de somar a linhas apagadas ou já recontadas.
+        """
+        filtro = "WHERE idUser = %s" if idUser is not None else ""
+        params = (idUser,) if idUser is not None else ()
+
+        linhas = 0
+        for shard in ([shard_de(idUser)] if idUser is not None else shards()):
+            with connection(shard=shard) as conn:
+                with conn.cursor() as cursor:
+                    if idUser is not None:
+                        cursor.execute(
+                            "SELECT pg_advisory_xact_lock_shared(%s, 0); SELECT pg_advisory_xact_lock(%s, %s);",
+                            (TransactionDatabase.LOCK_RESUMO, TransactionDatabase.LOCK_RESUMO, idUser)
+                        )
+                    else:
+                        cursor.execute("SELECT pg_advisory_xact_lock(%s, 0)", (TransactionDatabase.LOCK_RESUMO,))
+                    cursor.execute(f"DELETE FROM transactions_resumo_mensal {filtro}", params)
+                    cursor.execute(
+                        f'''
+                            INSERT INTO transactions_resumo_mensal (idUser, mes, categoria, total, quantidade)
+                            SELECT idUser, date_trunc('month', data)::date, categoria, SUM(valor), COUNT(*)
+                            FROM transactions
+                            {filtro}
+                            GROUP BY 1, 2, 3;
+                        ''',
+                        params
+                    )
+                    linhas += cursor.rowcount
+
+        if idUser is not None:
+            marcar_escrita(idUser)
+            analytics_cache.invalidate_user(idUser)
+        else:
+            analytics_cache.clear()
+        return linhas
+
+    @staticmethod
+    def get_dashboard(idUser) -> dict:
+        """
+        Retorna todos os agregados do dashboard do usuário em uma única consulta.
+
+        Os totais por mês e a lista de categorias vêm do resumo mensal
+        (custo proporcional a meses x categorias); o que depende de uma janela
+        móvel (último mês por categoria, por dia e o pendente) vem apenas das
+        transações a partir de um mês atrás. Os totais dos últimos 5 meses
+        contam a partir de NOW() - 5 meses: o mês em que essa data cai é
+        parcial, e essa parte sai das transações. As chaves do resultado têm o
+        nome das rotas que expõem cada parte.
+        """
         query = '''
-            SELECT 
-                categoria,
-                SUM(valor) AS total_valor
-            FROM transactions 
-            WHERE idUser = %s
-            AND data <= NOW()
-            AND data >= NOW() - INTERVAL '1 months'
+            WITH resumo AS (
+                SELECT mes, categoria, total
+                FROM transactions_resumo_mensal
+                WHERE idUser = %s
+                AND quantidade > 0
+            ),
+            recentes AS (
+                SELECT categoria, valor, data
+                FROM transactions
+                WHERE idUser = %s
+                AND data >= NOW() - INTERVAL '1 months'
+            ),
+            borda AS (
+                SELECT date_trunc('month', data)::date AS mes, SUM(valor) AS total
+                FROM transactions
+                WHERE idUser = %s
+                AND data >= NOW() - INTERVAL '5 months'
+                AND data < date_trunc('month', NOW() - INTERVAL '5 months') + INTERVAL '1 months'
+                GROUP BY 1
+            )
+            SELECT
+                'mes' AS tipo,
+                TO_CHAR(mes, 'Mon/YY') AS rotulo,
+                TO_CHAR(mes, 'YYYY-MM') AS ano_mes,
+                mes AS ordem,
+                SUM(total) AS total,
+                mes > date_trunc('month', NOW() - INTERVAL '5 months') AS recente
+            FROM resumo
+            GROUP BY mes
+            UNION ALL
+            SELECT 'borda', TO_CHAR(mes, 'Mon/YY'), TO_CHAR(mes, 'YYYY-MM'), mes, total, TRUE
+            FROM borda
+            UNION ALL
+            SELECT 'categoria', categoria, NULL, NULL, NULL, FALSE
+            FROM resumo
+            WHERE mes < date_trunc('month', NOW())
+            GROUP BY categoria
+            UNION ALL
+            SELECT 'categoria', categoria, NULL, NULL, SUM(valor), TRUE
+            FROM recentes
+            WHERE data <= NOW()
             GROUP BY categoria
-            ORDER BY categoria ASC;
+            UNION ALL
+            SELECT 'dia', TO_CHAR(data, 'DD/Mon'), NULL, MAX(data), SUM(valor), TRUE
+            FROM recentes
+            WHERE data > NOW() - INTERVAL '1 months'
+            AND data <= NOW()
+            GROUP BY 2
+            UNION ALL
+            SELECT 'pendente', NULL, NULL, NULL, SUM(valor), TRUE
+            FROM recentes
+            WHERE data >= NOW()
+            ORDER BY tipo, ordem, rotulo;
         '''
 
-        with connection() as conn:
+        with connection(leitura=True, idUser=idUser) as conn:
             with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,))
+                execute_prepared(cursor, query, (idUser, idUser, idUser))
                 resultado = cursor.fetchall()
-            
-            total_geral = sum(total_valor for _, total_valor in resultado)
-            
-            resultado_final = {
+
+        # O mês parcial de 5 meses atrás vem antes dos meses inteiros
+        ultimos_meses = {}
+        meses, dias = [], []
+        categorias, categorias_mes = set(), {}
+        pendente = 0.0
+        for tipo, rotulo, ano_mes, _, total, recente in resultado:
+            if tipo == 'borda':
+                ultimos_meses[rotulo] = float(total)
+            elif tipo == 'mes':
+                meses.append((rotulo, ano_mes, total, recente))
+            elif tipo == 'categoria':
+                categorias.add(rotulo)
+                if recente:
+                    categorias_mes[rotulo] = total
+            elif tipo == 'dia':
+                dias.append((rotulo, total))
+            else:
+                pendente = float(total or 0)
+
+        total_geral = sum(categorias_mes.values())
+        ultimos_meses.update((mes_ano, float(total)) for mes_ano, _, total, recente in meses if recente)
+
+        return {
+            'lest_transacao_mes': ultimos_meses,
+            'transacao_categoria': {
                 categoria: {
-                    "porcentagem": float(round((total_valor / total_geral) * 100, 2)),
-                    "total_gasto": float(total_valor),
+                    "porcentagem": float(round((total / total_geral) * 100, 2)) if total_geral else 0.0,
+                    "total_gasto": float(total),
                 }
-                for categoria, total_valor in resultado
-            }
+                for categoria, total in sorted(categorias_mes.items())
+            },
+            'transacao_next_transactions': {
+                'pendente': pendente
+            },
+            'transacao_days_in_month': {
+                dia: float(total) for dia, total in dias
+            },
+            'get_categorias': sorted(categorias),
+            'transacao_mes': [
+                {'mes': mes_ano, 'ano_mes': ano_mes} for mes_ano, ano_mes, _, _ in meses
+            ],
+        }
 
-        return resultado_final
-    
     @staticmethod
-    def get_transactions_predict_next_mes(IdUser) -> list:
+    def get_lest_transactions_mes(idUser) -> dict:
+        """
+        Retorna as últimas transações do usuário dos últimos 5 meses, agrupadas por mês.
+        """
+        return TransactionDatabase.get_dashboard(idUser)['lest_transacao_mes']
+
+    @staticmethod
+    def get_lest_transactions_mes_categoria(idUser) -> dict:
+        """
+        Retorna o total e a porcentagem gastos por categoria no último mês.
+        """
+        return TransactionDatabase.get_dashboard(idUser)['transacao_categoria']
+
+    @staticmethod
+    def get_transactions_predict_next_mes(IdUser) -> dict:
         """
         Retorna as transações previstas para o próximo mês.
-        """       
-        query = '''
-            SELECT 
-                TO_CHAR(data, 'Mon/YY') AS mes_ano,
-                SUM(valor) AS total_valor,
-                MAX(data) AS ultima_transacao
-            FROM transactions 
-            WHERE idUser = %s
-            AND data >= NOW()
-            GROUP BY mes_ano;
-        '''
-        
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (IdUser,))
-                resultado = cursor.fetchall()
-                if(not resultado):
-                    return {
-                        'pendente': 0.0
-                    }
-
-            resultado_final = {
-                'pendente': sum(float(total_valor) for _, total_valor, _ in resultado)
-            }
-            
-        return resultado_final
-    
+        """
+        return TransactionDatabase.get_dashboard(IdUser)['transacao_next_transactions']
+
     @staticmethod
-    def get_transactions_days_in_current_week(IdUser) -> list:
+    def get_transactions_days_in_current_week(IdUser) -> dict:
         """
         Retorna as transações do usuário dos últimos 30 dias, agrupadas por dia.
-        """       
-        query = '''
-            SELECT 
-                TO_CHAR(data, 'DD/Mon') AS dia,
-                SUM(valor) AS total_valor
-            FROM transactions 
-            WHERE idUser = %s
-            AND data > NOW() - INTERVAL '1 months'
-            AND data <= NOW()
-            GROUP BY dia;
-        '''
-        
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (IdUser,))
-                resultado = cursor.fetchall()
-                
-            resultado_final = {
-                dia: float(total_valor) for dia, total_valor in resultado
-            }
-            
-        return resultado_final
-    
-    @staticmethod
-    def get_lest_transactions_mes(idUser) -> dict:
         """
-        Retorna as últimas transações do usuário dos últimos 5 meses, agrupadas por mês.
-        """       
-        query = '''
-            SELECT 
-                TO_CHAR(data, 'Mon/YY') AS mes_ano,
-                SUM(valor) AS total_valor,
-                MAX(data) AS ultima_transacao
-            FROM transactions 
-            WHERE idUser = %s
-            AND data >= NOW() - INTERVAL '5 months'
-            GROUP BY mes_ano;
-        '''
+        return TransactionDatabase.get_dashboard(IdUser)['transacao_days_in_month']
 
-        resultado_final = {}
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,))
-                resultado = cursor.fetchall()
-                resultado = sorted(resultado, key=lambda x: x[2], reverse=False)
-                resultado_final = {
-                    mes_ano: float(total_valor) for mes_ano, total_valor, _ in resultado
-                }
-        return resultado_final 
-    
     @staticmethod
-    def get_categorias(idUser) -> dict:
+    def get_categorias(idUser) -> list:
         """
         Retorna as categorias de acordo com o mes escolhido pelo usuario.
-        """       
-        query = '''
-            SELECT categoria FROM transactions
-            WHERE idUser = %s
-            AND data <= NOW()
-            GROUP BY categoria;
-        '''
-        
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,))
-                resultado = cursor.fetchall()
-        
-        resultado = [categoria[0] for categoria in resultado]
-        
-        return resultado
-    
+        """
+        return TransactionDatabase.get_dashboard(idUser)['get_categorias']
+
     @staticmethod
-    def get_mes_transacoes(idUser) -> dict:
+    def get_mes_transacoes(idUser) -> list:
         """
             Retorna os meses que têm transações do usuário no formato 'Mon/YY' 
             e o correspondente 'YYYY-MM' para ser usado na pesquisa.
-        """       
-        query = '''
-            SELECT 
-                TO_CHAR(data, 'Mon/YY') AS mes_ano,
-                TO_CHAR(data, 'YYYY-MM') AS ano_mes
-            FROM transactions 
-            WHERE idUser = %s
-            AND (data <= NOW()
-            OR data >= NOW())
-            GROUP BY mes_ano, ano_mes
-            ORDER BY MAX(data) ASC;
-        '''
-        
-        resultado_final = {}
-
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,))
-                resultado = cursor.fetchall()
-                # Formatar o resultado conforme desejado
-                resultado_final = [{'mes': mes_ano, 'ano_mes': ano_mes} for mes_ano, ano_mes in resultado]
+        """
+        return TransactionDatabase.get_dashboard(idUser)['transacao_mes']
 
-        return resultado_final
-    
     @staticmethod
-    def get_transactions_categoria(idUser,categoria,mes) -> dict:
+    def get_transactions_categoria(idUser,categoria,mes) -> list:
         """
         Retorna as transacoes de acordo com a categoria escolhida pelo usuario e pelo mes.
-        """       
-        
-        query = '''
-            SELECT * FROM transactions 
-            WHERE idUser = %s
-            AND categoria = %s
-            AND data >= NOW() - INTERVAL '1 months'
-            GROUP BY dia;
-        '''
-        
-        with connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (idUser,categoria))
-                resultado = cursor.fetchall()
-                
-        return resultado
\ No newline at end of file
+        """
+        return TransactionDatabase.get_all_transactions(idUser, mes, categoria)
+
+
+# Commit agrupado das inserções de transações (desligado por padrão)
+transaction_commits = GroupCommit(
+    'transacoes',
+    TransactionDatabase.gravar_lote,
+    janela=float(getenv("DB_GROUP_COMMIT_WINDOW_MS", "2")) / 1000,
+    max_lote=int(getenv("DB_GROUP_COMMIT_MAX_BATCH", "200")),
+    max_fila=int(getenv("DB_GROUP_COMMIT_QUEUE_MAX", "10000")),
+    timeout=float(getenv("DB_GROUP_COMMIT_TIMEOUT", "5")),
+) if getenv("DB_GROUP_COMMIT", "false").lower() == "true" else None
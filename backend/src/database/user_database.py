@@ -1,36 +1,70 @@
+import logging
 from datetime import datetime
-from src.database.db import connection
+from src.database.db import connection, execute_prepared, shards
+from src.database.instrumentation import instrumentar
+from src.database.password_hasher import PasswordHasher
 from decimal import Decimal
 import random
+
+log = logging.getLogger(__name__)
+
+@instrumentar
 class UserDatabase:
 
+    # Colunas de users com as datas já formatadas pelo Postgres (mesmo formato do antigo strftime)
+    COLUNAS_USUARIO = '''
+        idUser, nome, sobrenome, email, senha,
+        to_char(criado, 'YYYY-MM-DD HH24:MI:SS.US'),
+        to_char(atualizado, 'YYYY-MM-DD HH24:MI:SS.US')
+    '''
+    CAMPOS_USUARIO = ("idUser", "nome", "sobrenome", "email", "senha", "criado", "atualizado")
+
     @staticmethod
     def format_user_data(user_tuple):
-        return {
-            "idUser": user_tuple[0],
-            "nome": user_tuple[1],
-            "sobrenome": user_tuple[2],
-            "email": user_tuple[3],
-            "senha": user_tuple[4],
-            "criado": user_tuple[5].strftime("%Y-%m-%d %H:%M:%S.%f") if isinstance(user_tuple[5], datetime) else user_tuple[5],
-            "atualizado": user_tuple[6].strftime("%Y-%m-%d %H:%M:%S.%f") if isinstance(user_tuple[6], datetime) else user_tuple[6]
-        }
+        return dict(zip(UserDatabase.CAMPOS_USUARIO, user_tuple))
+
+    @staticmethod
+    def particionado() -> bool:
+        """
+        Com mais de um shard, ids e e-mails passam pelo diretório global
+        (usuarios_diretorio, no shard principal); com um só, pela própria users.
+        """
+        return len(shards()) > 1
+
+    @staticmethod
+    def conexao_por_email(email):
+        """
+        Conexão do shard do usuário dono do e-mail, localizado pelo diretório.
+        Retorna None se o e-mail não estiver cadastrado ou sem conexão.
+        """
+        if not UserDatabase.particionado():
+            return connection()
+        conn = connection()
+        if not conn:
+            return None
+        with conn.cursor() as cursor:
+            execute_prepared(cursor, "SELECT idUser FROM usuarios_diretorio WHERE email = %s", (email,))
+            registro = cursor.fetchone()
+        conn.close()
+        return connection(idUser=registro[0]) if registro else None
         
     @staticmethod
     def get_new_password(user_id) -> str:
-        conn = connection()
+        new_password = random.randrange(0, 100000)
+        new_password = str(new_password)
+        new_password = new_password.zfill(6)
+        # Hash calculado antes de pegar a conexão, para não segurá-la durante o bcrypt
+        senha_hash = PasswordHasher.hash(new_password)
+        conn = connection(idUser=user_id)
         if conn:
             with conn.cursor() as cursor:
-                new_password = random.randrange(0, 100000)
-                new_password = str(new_password)
-                new_password = new_password.zfill(6)
                 cursor.execute(
                     '''
                         UPDATE users 
-                        SET senha = crypt(%s, gen_salt('bf')), atualizado = %s 
+                        SET senha = %s, atualizado = %s 
                         WHERE idUser = %s
                     ''',
-                    (new_password, datetime.now(), user_id)
+                    (senha_hash, datetime.now(), user_id)
                 )
                 conn.commit()
             conn.close()
@@ -39,10 +73,10 @@ class UserDatabase:
     
     @staticmethod
     def get_user_by_email(email):
-        conn = connection()
+        conn = UserDatabase.conexao_por_email(email)
         if conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users WHERE email = %s", (email,))
+                execute_prepared(cursor, f"SELECT {UserDatabase.COLUNAS_USUARIO} FROM users WHERE email = %s", (email,))
                 user = cursor.fetchone()
             conn.close()
             return UserDatabase.format_user_data(user) if user else None
@@ -50,37 +84,39 @@ class UserDatabase:
     
     @staticmethod
     def get_all_users():
-        conn = connection()
-        if conn:
-            with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users")
-                users = cursor.fetchall()
-            conn.close()
-            return users
-        return []
+        users = []
+        for shard in shards():
+            conn = connection(shard=shard)
+            if conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT * FROM users")
+                    users.extend(cursor.fetchall())
+                conn.close()
+        return users
 
     @staticmethod
     def update_user_password(email, password):
-        conn = connection()
+        senha_hash = PasswordHasher.hash(password)
+        conn = UserDatabase.conexao_por_email(email)
         if conn:
             with conn.cursor() as cursor:
                 cursor.execute(
                     '''
                         UPDATE users 
-                        SET senha = crypt(%s, gen_salt('bf')), atualizado = %s 
+                        SET senha = %s, atualizado = %s 
                         WHERE email = %s
                     ''',
-                    (password, datetime.now(), email)
+                    (senha_hash, datetime.now(), email)
                 )
                 conn.commit()
             conn.close()
     
     @staticmethod
     def get_user_by_id(user_id):
-        conn = connection()
+        conn = connection(idUser=user_id)
         if conn:
             with conn.cursor() as cursor:
-                cursor.execute("SELECT * FROM users WHERE idUser = %s", (user_id,))
+                execute_prepared(cursor, f"SELECT {UserDatabase.COLUNAS_USUARIO} FROM users WHERE idUser = %s", (user_id,))
                 user = cursor.fetchone()
             conn.close()
             return UserDatabase.format_user_data(user)
@@ -88,6 +124,9 @@ class UserDatabase:
 
     @staticmethod
     def create_user(nome, sobrenome, email, senha):
+        senha_hash = PasswordHasher.hash(senha)
+        if UserDatabase.particionado():
+            return UserDatabase.create_user_particionado(nome, sobrenome, email, senha_hash)
         conn = connection()
         if conn:
             with conn.cursor() as cursor:
@@ -95,9 +134,9 @@ class UserDatabase:
                     '''
                         INSERT INTO 
                         users (nome, sobrenome, email, senha ,criado, atualizado) 
-                        VALUES (%s, %s, %s, crypt(%s,gen_salt('bf')), %s, %s) returning idUser;
+                        VALUES (%s, %s, %s, %s, %s, %s) returning idUser;
                     ''',
-                    (nome, sobrenome, email, senha, datetime.now(), datetime.now())
+                    (nome, sobrenome, email, senha_hash, datetime.now(), datetime.now())
                 )
                 conn.commit()
                 user_id = cursor.fetchone()[0]
@@ -106,49 +145,122 @@ class UserDatabase:
         
         return False
 
+    @staticmethod
+    def create_user_particionado(nome, sobrenome, email, senha_hash):
+        """
+        Reserva o id (e o e-mail) no diretório global e grava o usuário no
+        shard que o anel atribui a esse id. Se a gravação no shard falhar, a
+        reserva é desfeita.
+        """
+        conn = connection()
+        if not conn:
+            return False
+        with conn:
+            with conn.cursor() as cursor:
+                cursor.execute("INSERT INTO usuarios_diretorio (email) VALUES (%s) RETURNING idUser", (email,))
+                user_id = cursor.fetchone()[0]
+
+        try:
+            with connection(idUser=user_id) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        '''
+                            INSERT INTO 
+                            users (idUser, nome, sobrenome, email, senha ,criado, atualizado) 
+                            VALUES (%s, %s, %s, %s, %s, %s, %s);
+                        ''',
+                        (user_id, nome, sobrenome, email, senha_hash, datetime.now(), datetime.now())
+                    )
+        except Exception:
+            with connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("DELETE FROM usuarios_diretorio WHERE idUser = %s", (user_id,))
+            raise
+        return user_id
+
     @staticmethod
     def update_user(user_id, **kwargs):
-        if not kwargs or not (conn := connection()):
+        if not kwargs:
             return
 
-        with conn.cursor() as cursor:
-            campos = ", ".join(
-                "senha = crypt(%s, gen_salt('bf'))" if k == "senha" else f"{k} = %s"
-                for k in kwargs
-            )
-            valores = [v for v in kwargs.values()]
-            valores.extend([datetime.now(), user_id])
-            
-            cursor.execute(
-                f"UPDATE users SET {campos}, atualizado = %s WHERE idUser = %s",
-                valores
-            )
-            conn.commit()
-        conn.close()
+        if "senha" in kwargs:
+            kwargs["senha"] = PasswordHasher.hash(kwargs["senha"])
+
+        if not (conn := connection(idUser=user_id)):
+            return
+
+        # Troca de e-mail com shards: o UPDATE do shard roda primeiro e só é
+        # confirmado depois do diretório, cuja restrição UNIQUE recusa e-mails
+        # de outro shard (e aí o do shard é desfeito). Se o commit do shard
+        # falhar com o diretório já alterado, o diretório volta ao e-mail anterior.
+        email_anterior = None
+        diretorio_alterado = False
+        try:
+            with conn:
+                with conn.cursor() as cursor:
+                    if "email" in kwargs and UserDatabase.particionado():
+                        cursor.execute("SELECT email FROM users WHERE idUser = %s FOR UPDATE", (user_id,))
+                        registro = cursor.fetchone()
+                        email_anterior = registro[0] if registro else None
+
+                    campos = ", ".join(f"{k} = %s" for k in kwargs)
+                    valores = [v for v in kwargs.values()]
+                    valores.extend([datetime.now(), user_id])
+
+                    cursor.execute(
+                        f"UPDATE users SET {campos}, atualizado = %s WHERE idUser = %s",
+                        valores
+                    )
+
+                if email_anterior is not None and email_anterior != kwargs["email"]:
+                    UserDatabase.atualizar_diretorio(user_id, kwargs["email"])
+                    diretorio_alterado = True
+        except Exception:
+            if diretorio_alterado:
+                try:
+                    UserDatabase.atualizar_diretorio(user_id, email_anterior)
+                except Exception as e:
+                    log.error(
+                        "E-mail do diretório não foi restaurado após falha no shard",
+                        extra={'idUser': user_id, 'erro': str(e)}
+                    )
+            raise
+
+    @staticmethod
+    def atualizar_diretorio(user_id, email):
+        with connection() as diretorio:
+            with diretorio.cursor() as cursor:
+                cursor.execute("UPDATE usuarios_diretorio SET email = %s WHERE idUser = %s", (email, user_id))
     
     @staticmethod
     def delete_user(user_id):
-        conn = connection()
+        conn = connection(idUser=user_id)
         if conn:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM users WHERE idUser = %s", (user_id,))
                 conn.commit()
             conn.close()
+            if UserDatabase.particionado():
+                with connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("DELETE FROM usuarios_diretorio WHERE idUser = %s", (user_id,))
     
     @staticmethod
     def connect_user(email,senha) -> tuple:
-        conn = connection()
+        user = None
+        conn = UserDatabase.conexao_por_email(email)
         if conn:
             with conn.cursor() as cursor:
-                cursor.execute('''
-                        SELECT * FROM users 
-                        WHERE email = %s AND senha = crypt(%s, senha);
-                    ''', 
-                    (email,senha)
-                )
+                # Mesmo comando preparado de get_user_by_email
+                execute_prepared(cursor, f"SELECT {UserDatabase.COLUNAS_USUARIO} FROM users WHERE email = %s", (email,))
                 user = cursor.fetchone()
             conn.close()
-            if user:
-                return (True, UserDatabase.format_user_data(user))
-        return False, None
 
+        # A senha é verificada no backend (pool do bcrypt), não no Postgres. Roda
+        # também quando o e-mail não existe (no diretório ou no shard), contra o
+        # hash fictício, para o tempo de resposta não revelar quais e-mails existem
+        if PasswordHasher.verify(senha, user[4] if user else None):
+            if PasswordHasher.needs_rehash(user[4]):
+                UserDatabase.update_user_password(email, senha)
+            return (True, UserDatabase.format_user_data(user))
+        return False, None
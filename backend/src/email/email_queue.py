@@ -0,0 +1,108 @@
+import logging
+import queue
+import threading
+import time
+from os import getenv, getpid
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from src.email.email_send import EmailSender
+
+
+log = logging.getLogger(__name__)
+
+
+EMAIL_QUEUE_DEPTH = Gauge('patocash_email_queue_depth', 'E-mails aguardando envio', multiprocess_mode='livesum')
+EMAIL_QUEUE_WAIT = Histogram('patocash_email_queue_wait_seconds', 'Tempo entre enfileirar e iniciar o envio')
+EMAIL_SEND_LATENCY = Histogram('patocash_email_send_seconds', 'Duracao de cada tentativa de envio SMTP')
+EMAIL_RESULTS = Counter('patocash_email_total', 'E-mails processados por resultado', ['resultado'])
+
+
+class EmailQueue:
+    """
+    Fila de envio de e-mails processada em segundo plano.
+
+    Cada worker mantém sua própria conexão SMTP (um EmailSender), aberta só no
+    primeiro envio e reaberta se cair. Falhas são tentadas de novo até
+    `max_tentativas` vezes, com espera exponencial a partir de `backoff`
+    segundos. As threads só são iniciadas no primeiro `enqueue` (e de novo
+    após um fork), então criar a fila no import não abre conexões.
+    """
+
+    def __init__(self, email=None, password=None, workers=2, max_fila=1000, max_tentativas=3, backoff=1.0, **smtp):
+        self.email = email
+        self.password = password
+        self.workers = workers
+        self.max_tentativas = max_tentativas
+        self.backoff = backoff
+        self._smtp = smtp
+        self._fila = queue.Queue(max_fila)
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _iniciar(self):
+        with self._lock:
+            if self._pid == getpid():
+                return
+            self._pid = getpid()
+            for numero in range(self.workers):
+                threading.Thread(target=self._worker, name=f'email-worker-{numero}', daemon=True).start()
+
+    def enqueue(self, subject, body, to) -> bool:
+        """
+        Enfileira um e-mail. Retorna False se a fila estiver cheia.
+        """
+        if self._pid != getpid():
+            self._iniciar()
+        try:
+            self._fila.put_nowait((subject, body, to, time.monotonic()))
+        except queue.Full:
+            EMAIL_RESULTS.labels('rejeitado').inc()
+            return False
+        EMAIL_QUEUE_DEPTH.set(self._fila.qsize())
+        return True
+
+    def _worker(self):
+        sender = EmailSender(self.email, self.password, **self._smtp)
+        while True:
+            subject, body, to, enfileirado_em = self._fila.get()
+            EMAIL_QUEUE_DEPTH.set(self._fila.qsize())
+            EMAIL_QUEUE_WAIT.observe(time.monotonic() - enfileirado_em)
+            try:
+                self._enviar(sender, subject, body, to)
+            finally:
+                self._fila.task_done()
+
+    def _enviar(self, sender, subject, body, to):
+        for tentativa in range(1, self.max_tentativas + 1):
+            inicio = time.monotonic()
+            try:
+                sender.send_email(subject=subject, body=body, to=to)
+                EMAIL_SEND_LATENCY.observe(time.monotonic() - inicio)
+                EMAIL_RESULTS.labels('enviado').inc()
+                return
+            except Exception as e:
+                EMAIL_SEND_LATENCY.observe(time.monotonic() - inicio)
+                sender.quit()
+                if tentativa == self.max_tentativas:
+                    EMAIL_RESULTS.labels('falhou').inc()
+                    log.error("Falha ao enviar e-mail após %d tentativas: %s", tentativa, e, extra={'to': to})
+                    return
+                EMAIL_RESULTS.labels('retentativa').inc()
+                time.sleep(self.backoff * 2 ** (tentativa - 1))
+
+    def join(self):
+        """
+        Bloqueia até que todos os e-mails enfileirados tenham sido processados.
+        """
+        self._fila.join()
+
+
+email_queue = EmailQueue(
+    getenv("EMAIL"),
+    getenv("EMAIL_PASSWORD"),
+    workers=int(getenv("EMAIL_WORKERS", "2")),
+    max_fila=int(getenv("EMAIL_QUEUE_MAX", "1000")),
+    max_tentativas=int(getenv("EMAIL_MAX_RETRIES", "3")),
+    backoff=float(getenv("EMAIL_RETRY_BACKOFF", "1")),
+)
@@ -2,39 +2,65 @@ from email.mime.application import MIMEApplication
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from os import getenv
 
 
 class EmailSender:
     """
-    Uma classe para gerenciar o envio de e-mails usando o servidor SMTP do Gmail.
+    Uma classe para gerenciar o envio de e-mails usando um servidor SMTP (por padrão, o do Gmail).
+
+    A conexão é aberta só no primeiro envio e reaberta automaticamente se o
+    servidor a tiver encerrado (ex.: por inatividade).
 
     Atributos:
         from_email (str): O endereço de e-mail do remetente.
         from_password (str): A senha ou senha específica do aplicativo do remetente.
-        server (smtplib.SMTP): A instância do servidor SMTP para envio de e-mails.
+        host (str): O endereço do servidor SMTP.
+        port (int): A porta do servidor SMTP.
+        starttls (bool): Se a conexão deve ser criptografada com STARTTLS.
+        server (smtplib.SMTP): A instância do servidor SMTP, ou None enquanto desconectado.
     """
 
-    def __init__(self, email=None, password=None):
+    def __init__(self, email=None, password=None, host=None, port=None, starttls=None, timeout=30):
         """
-        Inicializa a instância do EmailSender e configura o servidor SMTP.
+        Inicializa a instância do EmailSender sem abrir conexão.
 
         Args:
             email (str): O endereço de e-mail do remetente.
             password (str): A senha ou senha específica do aplicativo do remetente.
+                Se vazia, o envio é feito sem autenticação (ex.: servidor SMTP local de testes).
+            host (str): O servidor SMTP. Padrão: SMTP_HOST ou smtp.gmail.com.
+            port (int): A porta SMTP. Padrão: SMTP_PORT ou 587.
+            starttls (bool): Usa STARTTLS. Padrão: SMTP_STARTTLS ou True.
+            timeout (float): Tempo máximo, em segundos, das operações de rede.
+        """
+        self.from_email = email
+        self.from_password = password
+        self.host = host or getenv("SMTP_HOST", "smtp.gmail.com")
+        self.port = int(port or getenv("SMTP_PORT", "587"))
+        self.starttls = starttls if starttls is not None else getenv("SMTP_STARTTLS", "true").lower() == "true"
+        self.timeout = timeout
+        self.server = None
+
+    def connect(self):
+        """
+        Abre a conexão com o servidor SMTP e autentica o remetente.
 
         Execuções:
             smtplib.SMTPAuthenticationError: Se as credenciais de login estiverem incorretas.
         """
-        self.from_email = email
-        self.from_password = password
-        self.server = smtplib.SMTP('smtp.gmail.com', 587)  # Conecta ao servidor SMTP do Gmail.
-        self.server.starttls()  # Inicia a criptografia TLS.
-        self.server.login(self.from_email, self.from_password)  # Autentica o remetente.
+        self.server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)  # Conecta ao servidor SMTP.
+        if self.starttls:
+            self.server.starttls()  # Inicia a criptografia TLS.
+        if self.from_password:
+            self.server.login(self.from_email, self.from_password)  # Autentica o remetente.
 
     def send_email(self, subject, body, to):
         """
         Envia um e-mail com o assunto, corpo e destinatário especificados.
 
+        Se a conexão tiver caído, reconecta e tenta mais uma vez.
+
         Args:
             subject (str): O assunto do e-mail.
             body (str): O conteúdo do corpo do e-mail, em formato HTML.
@@ -52,10 +78,26 @@ class EmailSender:
         # Anexa o conteúdo do corpo como HTML.
         msg.attach(MIMEText(body, 'html'))
 
-        # Envia a mensagem de e-mail.
-        self.server.send_message(msg)
-
+        # Envia a mensagem de e-mail, reabrindo a conexão se necessário.
+        reconectou = self.server is None
+        if self.server is None:
+            self.connect()
+        try:
+            self.server.send_message(msg)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            if reconectou:
+                raise
+            self.quit()
+            self.connect()
+            self.server.send_message(msg)
 
-
-def quit(self):
-    self.server.quit()
\ No newline at end of file
+    def quit(self):
+        """
+        Encerra a conexão com o servidor SMTP, se houver.
+        """
+        server, self.server = self.server, None
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
@@ -0,0 +1,164 @@
+import atexit
+import copy
+import logging
+import queue
+import random
+import sys
+import threading
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from os import getenv, getpid
+
+from flask import g, request
+from prometheus_client import Counter
+
+from src.response.json_response import dumps
+
+
+LOG_DROPPED = Counter(
+    'patocash_log_dropped_total',
+    'Registros de log descartados com a fila de log cheia'
+)
+
+# Atributos padrão do LogRecord; os demais vieram de `extra` e viram campos do JSON
+_ATRIBUTOS_PADRAO = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime', 'request_id', 'amostragem'}
+
+_request_id = ContextVar('patocash_request_id', default=None)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Anexa o id da requisição atual ao registro e aplica a amostragem: um
+    registro com `extra={'amostragem': 0.01}` é mantido em 1% das chamadas.
+    Roda na thread de quem loga, antes do registro entrar na fila.
+    """
+
+    def filter(self, record):
+        amostragem = getattr(record, 'amostragem', None)
+        if amostragem is not None and random.random() >= amostragem:
+            return False
+        record.request_id = _request_id.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de `extra` no nível raiz."""
+
+    def format(self, record):
+        registro = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        if getattr(record, 'request_id', None):
+            registro['request_id'] = record.request_id
+        for chave, valor in vars(record).items():
+            if chave not in _ATRIBUTOS_PADRAO:
+                registro[chave] = valor
+        if record.exc_text:
+            registro['exc'] = record.exc_text
+        try:
+            return dumps(registro).decode('utf-8')
+        except TypeError:
+            # Campo extra sem representação JSON: vai como texto
+            return dumps({chave: valor if isinstance(valor, (str, int, float, bool, type(None))) else str(valor)
+                          for chave, valor in registro.items()}).decode('utf-8')
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enfileira o registro para a thread de escrita sem nunca bloquear quem
+    loga: com a fila cheia o registro é descartado e contado.
+    """
+
+    def prepare(self, record):
+        # Mensagem e traceback resolvidos aqui, pois os argumentos podem mudar depois
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_DROPPED.inc()
+
+
+_listener = None
+_listener_pid = None
+_lock = threading.Lock()
+
+
+def configurar_logging():
+    """
+    Configura o logging do processo: o logger raiz só enfileira (JSON por
+    linha) e uma thread escreve no stdout. O nível geral vem de LOG_LEVEL e
+    níveis por logger de LOG_LEVELS (ex.: 'src.database=WARNING,src.routes=DEBUG').
+    Depois de um fork (workers do gunicorn) a thread de escrita é recriada.
+    """
+    global _listener, _listener_pid
+    with _lock:
+        if _listener is not None and _listener_pid == getpid():
+            return
+
+        fila = queue.Queue(int(getenv("LOG_QUEUE_MAX", "10000")))
+        saida = logging.StreamHandler(sys.stdout)
+        saida.setFormatter(JsonFormatter())
+
+        enfileirador = NonBlockingQueueHandler(fila)
+        enfileirador.addFilter(ContextFilter())
+
+        raiz = logging.getLogger()
+        for handler in list(raiz.handlers):
+            if isinstance(handler, NonBlockingQueueHandler):
+                raiz.removeHandler(handler)
+        raiz.addHandler(enfileirador)
+        raiz.setLevel(getenv("LOG_LEVEL", "INFO").upper())
+
+        for item in filter(None, getenv("LOG_LEVELS", "").split(',')):
+            nome, _, nivel = item.partition('=')
+            logging.getLogger(nome.strip()).setLevel(nivel.strip().upper())
+
+        _listener = QueueListener(fila, saida, respect_handler_level=True)
+        _listener.start()
+        _listener_pid = getpid()
+        atexit.register(_listener.stop)
+
+
+class RequestIdMiddleware:
+    """
+    Id de correlação por requisição: usa o X-Request-ID recebido (ex.: do
+    ingress) ou gera um, anexa a todos os logs da requisição e devolve no
+    cabeçalho da resposta.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.before_request(self.iniciar)
+        app.after_request(self.cabecalho)
+        app.teardown_request(self.finalizar)
+
+    def iniciar(self):
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+        _request_id.set(g.request_id)
+
+    def cabecalho(self, response):
+        if 'request_id' in g:
+            response.headers['X-Request-ID'] = g.request_id
+        return response
+
+    def finalizar(self, exc):
+        _request_id.set(None)
+
+
+request_id_middleware = RequestIdMiddleware()
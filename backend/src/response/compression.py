@@ -0,0 +1,116 @@
+import zlib
+from os import getenv
+
+import brotli
+from flask import request
+
+
+# Tipos que valem a pena comprimir; os demais (imagens, gzip, etc.) já são compactos
+TIPOS_COMPRIMIVEIS = {
+    'application/json',
+    'application/x-ndjson',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def comprimivel(mimetype) -> bool:
+    return (
+        mimetype in TIPOS_COMPRIMIVEIS
+        or mimetype.startswith('text/')
+        or mimetype.endswith('+json')
+    )
+
+
+def comprimir_stream(blocos, codificacao='gzip', nivel=6, qualidade_brotli=5):
+    """
+    Comprime em gzip ou brotli uma sequência de blocos de bytes, bloco a bloco.
+    Fechar o gerador fecha também `blocos` (ex.: cancela um COPY em andamento).
+    """
+    if codificacao == 'br':
+        compressor = brotli.Compressor(quality=qualidade_brotli)
+        comprimir, finalizar = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(nivel, wbits=31)
+        comprimir, finalizar = compressor.compress, compressor.flush
+    try:
+        for bloco in blocos:
+            comprimido = comprimir(bloco)
+            if comprimido:
+                yield comprimido
+        yield finalizar()
+    finally:
+        if hasattr(blocos, 'close'):
+            blocos.close()
+
+
+class ResponseMiddleware:
+    """
+    Pós-processamento das respostas do app: GET condicional e compressão.
+
+    Respostas 200 de GET/HEAD sem ETag recebem uma calculada do corpo (rotas
+    com cache já trazem a sua, calculada uma vez quando a entrada foi criada)
+    e `If-None-Match` com a mesma versão vira 304 sem corpo. Corpos maiores
+    que `etag_maximo` bytes e respostas em streaming ficam sem ETag, para não
+    ler e calcular o hash do corpo inteiro a cada requisição. Em seguida o
+    corpo é comprimido com brotli ou gzip, conforme o Accept-Encoding, se
+    tiver pelo menos `tamanho_minimo` bytes; respostas em streaming são
+    comprimidas bloco a bloco. Quando o cliente aceita compressão a ETag
+    passa a ser fraca, já que os bytes enviados dependem da codificação.
+    """
+
+    def __init__(self, app=None, tamanho_minimo=1024, nivel=6, qualidade_brotli=5, etag_maximo=1048576):
+        self.tamanho_minimo = tamanho_minimo
+        self.etag_maximo = etag_maximo
+        self.nivel = nivel
+        self.qualidade_brotli = qualidade_brotli
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.after_request(self.processar)
+
+    def processar(self, response):
+        codificacao = None
+        if comprimivel(response.mimetype or ''):
+            response.vary.add('Accept-Encoding')
+            if 'Content-Encoding' not in response.headers:
+                codificacao = request.accept_encodings.best_match(('br', 'gzip'))
+
+        if request.method in ('GET', 'HEAD') and response.status_code == 200:
+            if not response.is_streamed and not response.direct_passthrough:
+                etag, fraca = response.get_etag()
+                if etag is None and (response.calculate_content_length() or 0) <= self.etag_maximo:
+                    response.add_etag()
+                    etag, fraca = response.get_etag()
+                if etag is not None:
+                    # Fraca sempre que o corpo pode sair comprimido, para que o 304 e o 200 tragam a mesma ETag
+                    if codificacao is not None and not fraca:
+                        response.set_etag(etag, weak=True)
+                    response.make_conditional(request)
+
+        if codificacao is not None and response.status_code == 200 and not response.direct_passthrough:
+            self.comprimir(response, codificacao)
+        return response
+
+    def comprimir(self, response, codificacao):
+        if response.is_streamed:
+            response.response = comprimir_stream(response.response, codificacao, self.nivel, self.qualidade_brotli)
+            response.headers.pop('Content-Length', None)
+        else:
+            corpo = response.get_data()
+            if len(corpo) < self.tamanho_minimo:
+                return
+            if codificacao == 'br':
+                response.set_data(brotli.compress(corpo, quality=self.qualidade_brotli))
+            else:
+                response.set_data(zlib.compress(corpo, self.nivel, wbits=31))
+        response.headers['Content-Encoding'] = codificacao
+
+response_middleware = ResponseMiddleware(
+    tamanho_minimo=int(getenv("COMPRESS_MIN_SIZE", "1024")),
+    nivel=int(getenv("COMPRESS_LEVEL", "6")),
+    qualidade_brotli=int(getenv("COMPRESS_BROTLI_QUALITY", "5")),
+    etag_maximo=int(getenv("ETAG_MAX_SIZE", "1048576")),
+)
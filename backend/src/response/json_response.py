@@ -0,0 +1,65 @@
+from datetime import date
+from decimal import Decimal
+
+import orjson
+from flask import Response
+from flask.json.provider import JSONProvider
+from werkzeug.http import http_date
+
+
+def _padrao(obj):
+    # Decimal vira número; datas seguem o formato do jsonify padrão do Flask (RFC 822)
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, date):
+        return http_date(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(dados) -> bytes:
+    """
+    Serializa para JSON (bytes UTF-8) com o orjson. As rotas devem receber as
+    linhas já formatadas pelo SQL; Decimal e datas são aceitos por compatibilidade.
+    """
+    return orjson.dumps(dados, default=_padrao, option=orjson.OPT_PASSTHROUGH_DATETIME)
+
+
+def json_response(dados, status=200, **kwargs) -> Response:
+    """
+    Resposta application/json com o corpo serializado por `dumps`.
+    """
+    return Response(dumps(dados), status=status, mimetype='application/json', **kwargs)
+
+
+def stream_json_array(itens, tamanho_bloco=500):
+    """
+    Serializa os itens como um array JSON em blocos, sem montar a lista inteira em memória.
+    """
+    yield b'['
+    separador = b''
+    bloco = []
+    for item in itens:
+        bloco.append(dumps(item))
+        if len(bloco) == tamanho_bloco:
+            yield separador + b','.join(bloco)
+            separador = b','
+            bloco = []
+    if bloco:
+        yield separador + b','.join(bloco)
+    yield b']'
+
+
+class OrjsonProvider(JSONProvider):
+    """
+    Provider de JSON do Flask baseado em `dumps`, para que `jsonify` e
+    `request.get_json()` usem o mesmo serializador das demais rotas.
+    """
+
+    def dumps(self, obj, **kwargs) -> str:
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs) -> Response:
+        return self._app.response_class(dumps(self._prepare_response_obj(args, kwargs)), mimetype='application/json')
@@ -1,15 +1,35 @@
 from flask import Blueprint, jsonify, request
+import logging
 import json
 
 from src.database.card_database import CardDatabase
 
 card_routes = Blueprint('card_routes', __name__)
+log = logging.getLogger(__name__)
 
 @card_routes.route('/cards/id=<int:id>', methods=['GET'])
 def get_cards(id):
-    cards = CardDatabase.get_all_cards(id)
+    # ?progresso=true inclui o gasto do mês comparado com a meta de cada cartão
+    progresso = request.args.get('progresso', 'false').lower() == 'true'
+    cards = CardDatabase.get_all_cards(id, progresso=progresso)
     return jsonify(cards)
 
+@card_routes.route('/cards/id=<int:id>', methods=['PATCH'])
+def update_cards(id):
+    """
+    Altera vários cartões do usuário em um comando. Corpo:
+    {"cartoes": [{"idCartao": 1, "meta": 500}, {"idCartao": 2, "nome": "Nubank", "tipo": "Crédito"}]}
+    """
+    data = request.get_json(silent=True)
+    cartoes = data.get('cartoes') if isinstance(data, dict) else None
+    if not isinstance(cartoes, list) or not all(isinstance(cartao, dict) for cartao in cartoes):
+        return jsonify({"error": "Corpo deve ter 'cartoes', uma lista de objetos"}), 400
+    try:
+        alterados = CardDatabase.update_cards(cartoes, idUser=id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"alterados": alterados}), 200
+
 @card_routes.route('/cards/id=<int:id>', methods=['POST'])
 def create_card(id):
     data = request.get_json()
@@ -24,12 +44,21 @@ def create_card(id):
 
 @card_routes.route('/cards/update_meta', methods=['PUT'])
 def update_card():
-    data = request.get_json()
-    print(f'Formulario {data}')
-    
-    CardDatabase.update_card_meta(
-        idCartao=data['idCartao'],
-        meta=data['meta']
-    )
+    data = request.get_json(silent=True)
+    log.debug("Atualização de meta do cartão", extra={'dados': data})
+    if not isinstance(data, dict) or 'meta' not in data:
+        return jsonify({"error": "Corpo deve ter idCartao e meta"}), 400
+    idUser = data.get('idUser')
+    if idUser is not None and not str(idUser).isdigit():
+        return jsonify({"error": f"idUser inválido: {idUser!r}"}), 400
+
+    try:
+        CardDatabase.update_card_meta(
+            idCartao=data.get('idCartao'),
+            meta=data['meta'],
+            idUser=int(idUser) if idUser is not None else None
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
     return jsonify({"message": "Card updated successfully"}), 200
\ No newline at end of file
@@ -0,0 +1,26 @@
+from flask import Blueprint, jsonify
+from src.cache.catalog_cache import catalogo
+from src.database.slow_query import slow_query_log
+from src.response.json_response import json_response
+
+# Registrado pelo app apenas com DEBUG_ENDPOINTS=true
+debug_routes = Blueprint('debug', __name__)
+
+@debug_routes.route('/debug/slow_queries', methods=['GET'])
+def get_slow_queries():
+    # Amostras deste worker do gunicorn; cada processo tem o seu buffer
+    return json_response({
+        "limite_ms": slow_query_log.limite * 1000 if slow_query_log.limite != float('inf') else None,
+        "amostras": slow_query_log.amostras(),
+    }, headers={'Cache-Control': 'no-store'})
+
+@debug_routes.route('/debug/slow_queries', methods=['DELETE'])
+def limpar_slow_queries():
+    slow_query_log.limpar()
+    return jsonify({"message": "Slow query log limpo"}), 200
+
+@debug_routes.route('/debug/posso_ajudar/recarregar', methods=['POST'])
+def recarregar_catalogo():
+    # Recarrega só o snapshot deste worker; os demais seguem o TTL (CATALOGO_TTL)
+    snapshot = catalogo.recarregar()
+    return jsonify({"message": "Catálogo recarregado neste processo", "versao": snapshot.versao}), 200
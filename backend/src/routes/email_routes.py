@@ -1,11 +1,11 @@
 from flask import Blueprint, request, jsonify
-from src.email.email_send import EmailSender
+import logging
+from src.email.email_queue import email_queue
 from src.email.email_body import criar_corpo_email_recupercao_de_conta_html
 from src.database.user_database import UserDatabase
-from os import getenv
 
-email_sender = EmailSender(getenv("EMAIL"), getenv("EMAIL_PASSWORD"))
 email_routes = Blueprint('email_routes', __name__)
+log = logging.getLogger(__name__)
 
 @email_routes.route(
     '/email/recuperar_senha/', methods=['POST']
@@ -14,20 +14,23 @@ def recuperar_senha():
     data = request.get_json()
     email = data['email']
 
-    print(f"Recuperar senha para o email: {email}")
+    log.info("Recuperação de senha solicitada", extra={'email': email})
     try:
         # Verifica se o email existe na base de dados
         user = UserDatabase.get_user_by_email(email)
         if not user:
             return jsonify({"error": "Email não cadastrado."}), 404
-        email_sender.send_email(
+        # O envio é feito em segundo plano pela fila de e-mails
+        enfileirado = email_queue.enqueue(
             subject='Recuperação de Senha',
             to=email,
             body=criar_corpo_email_recupercao_de_conta_html(
                 email=email
             )
         )
-        return jsonify({"message": "Email sent successfully"}), 200
+        if not enfileirado:
+            return jsonify({"error": "Fila de e-mails cheia, tente novamente."}), 503
+        return jsonify({"message": "Email queued successfully"}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -36,9 +39,7 @@ def alterar_senha(email):
     data = request.get_json()
     senha = data['senha']
     
-    print(f"Alterar senha para o email: {email}")
-    
-    print(f"Alterar senha para o email: {email}")
+    log.info("Alteração de senha solicitada", extra={'email': email})
     try:
         UserDatabase.update_user_password(email=email, password=senha)
         return jsonify({"message": "Password changed successfully"}), 200
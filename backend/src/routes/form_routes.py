@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, request, redirect, make_response
+import logging
 from src.database.form_database import FormDatabase
 import json
 
 form_routes = Blueprint('form', __name__)
+log = logging.getLogger(__name__)
 
 @form_routes.route('/respostas/id=<int:id>', methods=['GET'])
 def get_respostas(id):
@@ -26,10 +28,35 @@ def create_respostas(id):
 @form_routes.route('/respostas/update_meta/id=<int:id>', methods=['PUT'])
 def update_respostas(id):
     data = request.get_json()
-    print(data)
+    log.debug("Questionário recebido", extra={'dados': data})
     updated = FormDatabase.update_last_answer(id, data['meta'])
     
     if not updated:
         return jsonify({"error": "Failed to update response"}), 500
     else:
-        return jsonify({"message": "Response updated successfully"}), 200
\ No newline at end of file
+        return jsonify({"message": "Response updated successfully"}), 200
+
+@form_routes.route('/respostas/id=<int:id>', methods=['PATCH'])
+def patch_respostas(id):
+    """
+    Altera várias respostas em uma chamada. Corpo:
+    {"alterar": [{"indice": 0, "resposta": "2"}, ...], "adicionar": ["1500", ...]}
+    Índices negativos contam do fim (-1 é a última resposta).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Corpo deve ser um objeto JSON"}), 400
+    try:
+        alterar = [(int(item['indice']), item['resposta']) for item in data.get('alterar') or []]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"error": "Cada item de 'alterar' precisa de 'indice' inteiro e 'resposta'"}), 400
+    adicionar = data.get('adicionar') or []
+    if not isinstance(adicionar, list):
+        return jsonify({"error": "'adicionar' deve ser uma lista de respostas"}), 400
+    if not alterar and not adicionar:
+        return jsonify({"error": "Nada para alterar"}), 400
+
+    resposta = FormDatabase.update_answers(id, alterar, adicionar)
+    if resposta is None:
+        return jsonify({"error": "Questionário não encontrado ou índice fora do questionário"}), 404
+    return jsonify({'resposta': resposta}), 200
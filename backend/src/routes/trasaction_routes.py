@@ -1,27 +1,89 @@
-from flask import Blueprint, jsonify, Response, request
+from flask import Blueprint, jsonify, Response, request, stream_with_context
+import logging
+import csv
+import io
 import json
+from datetime import date
 from src.database.transaction_database import TransactionDatabase
+from src.cache.response_cache import analytics_cache
+from src.response.json_response import json_response, stream_json_array
+from src.response.compression import comprimir_stream
 
 router_transaction = Blueprint('transacao', __name__)
+log = logging.getLogger(__name__)
+
+LIMITE_MAXIMO_PAGINA = 500
+
+MIMETYPE_COLUNAR = 'application/vnd.patocash.columnar+json'
+
+def quer_colunar() -> bool:
+    """
+    Formato colunar (opt-in) via ?format=columnar ou Accept com o mimetype colunar.
+    """
+    if 'format' in request.args:
+        return request.args.get('format') == 'columnar'
+    return request.accept_mimetypes[MIMETYPE_COLUNAR] > request.accept_mimetypes['application/json']
+
+def filtros_validos(mes, after) -> bool:
+    """
+    Confere o mês ('YYYY-MM' ou 'todos') e o cursor de paginação
+    ('YYYY-MM-DD_idTransaction') antes de qualquer consulta.
+    """
+    try:
+        if mes and mes != 'todos':
+            TransactionDatabase.intervalo_mes(mes)
+        if after:
+            data, idTransaction = after.split('_')
+            date.fromisoformat(data)
+            int(idTransaction)
+    except ValueError:
+        return False
+    return True
 
 @router_transaction.route('/transacao/', methods=['GET'])
 def get_transacoes():
     idUser = request.args.get('id')  # Recebe o ID do usuário
     mes = request.args.get('mes')  # Recebe o mês filtrado (opcional)
     categoria = request.args.get('categoria')  # Recebe a categoria filtrada (opcional)
+    limit = request.args.get('limit')  # Tamanho da página (opcional)
+    after = request.args.get('after')  # Cursor devolvido pela página anterior (opcional)
+    colunar = quer_colunar()  # Colunas paralelas em vez de um objeto por transação (opcional)
+
+    if not filtros_validos(mes, after):
+        return jsonify({"error": "Parâmetro 'mes' ou 'after' inválido"}), 400
 
-    # Chama a função para pegar as transações com base nos filtros
-    transacoes = TransactionDatabase.get_all_transactions(idUser, mes, categoria)
+    # Com limit, responde uma página e o cursor da próxima
+    if limit:
+        try:
+            limit = min(int(limit), LIMITE_MAXIMO_PAGINA)
+            if limit < 1:
+                raise ValueError(limit)
+            transacoes, proximo = TransactionDatabase.get_transactions_page(idUser, limit, after, mes, categoria, colunar)
+        except ValueError:
+            return jsonify({"error": "Parâmetros de paginação inválidos"}), 400
+
+        return json_response({"transacoes": transacoes, "proximo": proximo}, headers={'Vary': 'Accept'})
+
+    # Formato colunar: as colunas são montadas a partir do cursor no servidor e enviadas de uma vez
+    if colunar:
+        return json_response(
+            TransactionDatabase.get_transactions_columnar(idUser, mes, categoria),
+            headers={'Vary': 'Accept'}
+        )
+
+    # Sem limit, envia o histórico completo em streaming a partir de um cursor no servidor
+    transacoes = TransactionDatabase.iter_transactions(idUser, mes, categoria)
 
     return Response(
-        json.dumps(transacoes), 
-        mimetype='application/json'
+        stream_with_context(stream_json_array(transacoes)), 
+        mimetype='application/json',
+        headers={'Vary': 'Accept'}
     )
 
 @router_transaction.route('/transacao/id=<int:id>', methods=['POST'])
 def add_transacao(id):
     data = request.get_json()
-    print(data)
+    log.debug("Transação recebida", extra={'idUser': id, 'dados': data, 'amostragem': 0.01})
     TransactionDatabase.insert_transaction(
         idUser=id,
         estabelecimento=data['estabelecimento'],
@@ -31,52 +93,112 @@ def add_transacao(id):
     )
     return jsonify({"message": "Card created successfully"}), 201
 
+TIPOS_JSON_LINES = ('application/x-ndjson', 'application/jsonl', 'application/x-jsonlines')
+
+def ler_json_lines(texto):
+    """
+    Gera (número da linha, registro) para cada linha não vazia de um JSON Lines.
+    Linhas que não são JSON válido seguem como texto e são rejeitadas na validação.
+    """
+    for numero, linha in enumerate(texto, start=1):
+        if not linha.strip():
+            continue
+        try:
+            yield numero, json.loads(linha)
+        except json.JSONDecodeError:
+            yield numero, linha
+
+@router_transaction.route('/transacao/importar/id=<int:id>', methods=['POST'])
+def importar_transacoes(id):
+    texto = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+
+    # CSV com cabeçalho estabelecimento,categoria,valor,data ou JSON Lines com os mesmos campos
+    if request.mimetype == 'text/csv':
+        leitor = csv.DictReader(texto)
+        registros = ((leitor.line_num, linha) for linha in leitor)
+    elif request.mimetype in TIPOS_JSON_LINES:
+        registros = ler_json_lines(texto)
+    else:
+        return jsonify({"error": "Envie text/csv ou application/x-ndjson"}), 415
+
+    try:
+        resultado = TransactionDatabase.import_transactions(id, registros)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not resultado['importadas'] and resultado['total_erros']:
+        return jsonify(resultado), 400
+    return jsonify(resultado), 200
+
+@router_transaction.route('/transacao/exportar/id=<int:id>', methods=['GET'])
+def exportar_transacoes(id):
+    formato = request.args.get('formato', 'csv')  # csv ou jsonl
+    de = request.args.get('de')  # Data inicial YYYY-MM-DD (opcional)
+    ate = request.args.get('ate')  # Data final YYYY-MM-DD (opcional)
+    categoria = request.args.get('categoria')  # Categoria filtrada (opcional)
+    comprimir = request.args.get('gzip') in ('1', 'true')
+
+    if formato not in ('csv', 'jsonl'):
+        return jsonify({"error": "Formato deve ser csv ou jsonl"}), 400
+
+    try:
+        blocos = TransactionDatabase.export_transactions(id, formato, de, ate, categoria)
+    except ValueError:
+        return jsonify({"error": "Datas devem estar no formato YYYY-MM-DD"}), 400
+
+    nome_arquivo = f"transacoes_{id}.{formato}"
+    mimetype = 'text/csv' if formato == 'csv' else 'application/x-ndjson'
+    if comprimir:
+        blocos = comprimir_stream(blocos, 'gzip')
+        nome_arquivo += '.gz'
+        mimetype = 'application/gzip'
+
+    return Response(
+        stream_with_context(blocos),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{nome_arquivo}"'}
+    )
+
+@router_transaction.route('/dashboard/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('dashboard')
+def get_dashboard(id):
+    dashboard = TransactionDatabase.get_dashboard(id)
+    return json_response(dashboard)
+
 @router_transaction.route('/get_categorias/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('get_categorias')
 def get_categoria(id):
     transactions = TransactionDatabase.get_categorias(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
+    return json_response(transactions)
     
 @router_transaction.route('/transacao_mes/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('transacao_mes')
 def get_transactions_mes(id):
     transactions = TransactionDatabase.get_mes_transacoes(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
+    return json_response(transactions)
 
 
 @router_transaction.route('/lest_transacao_mes/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('lest_transacao_mes')
 def get_lest_transactions(id):
     transactions = TransactionDatabase.get_lest_transactions_mes(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
+    return json_response(transactions)
 
 
 @router_transaction.route('/transacao_categoria/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('transacao_categoria')
 def get_lest_transactions_mes_categorial(id):
     transactions = TransactionDatabase.get_lest_transactions_mes_categoria(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
+    return json_response(transactions)
 
 @router_transaction.route('/transacao_next_transactions/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('transacao_next_transactions')
 def get_next_transactions(id):
     transactions = TransactionDatabase.get_transactions_predict_next_mes(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
+    return json_response(transactions)
 
 @router_transaction.route('/transacao_days_in_month/id=<int:id>', methods=['GET'])
+@analytics_cache.cached('transacao_days_in_month')
 def get_days_in_month(id):
     transactions = TransactionDatabase.get_transactions_days_in_current_week(id)
-    return Response(
-            json.dumps(transactions), 
-            mimetype='application/json'
-    )
\ No newline at end of file
+    return json_response(transactions)
\ No newline at end of file
@@ -1,8 +1,10 @@
 from flask import Blueprint, jsonify, request, redirect, make_response
+import logging
 from src.database.transaction_database import TransactionDatabase
 from src.database.user_database import UserDatabase
 
 router_user = Blueprint('user', __name__)
+log = logging.getLogger(__name__)
 
 @router_user.route('/users', methods=['GET'])
 def get_users():
@@ -51,7 +53,7 @@ def delete_user(id):
 def login():
     data = request.get_json()
     
-    print(f"Login attempt for email: {data['email']}")
+    log.debug("Tentativa de login", extra={'email': data['email']})
     connect,user = UserDatabase.connect_user(data['email'], data['senha'])
     
     if connect:
@@ -13,6 +13,14 @@ CREATE TABLE IF NOT EXISTS users (
   atualizado TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP  -- Data e hora da última atualização
 );
 
+-- Diretório global de usuários, usado só no shard principal quando o backend
+-- roda com mais de um shard (POSTGRES_SHARDS): gera os ids dos novos usuários
+-- (únicos entre todos os shards) e localiza o usuário pelo e-mail
+CREATE TABLE IF NOT EXISTS usuarios_diretorio (
+  idUser SERIAL PRIMARY KEY,
+  email VARCHAR(255) NOT NULL UNIQUE
+);
+
 -- Criação da tabela 'transactions'
 CREATE TABLE IF NOT EXISTS transactions (
   idTransaction SERIAL PRIMARY KEY,  -- Auto incremento
@@ -24,6 +32,23 @@ CREATE TABLE IF NOT EXISTS transactions (
   CONSTRAINT fk_user FOREIGN KEY (idUser) REFERENCES users (idUser) ON DELETE CASCADE ON UPDATE CASCADE
 );
 
+-- Índices das consultas por usuário: listagem/filtro por mês (intervalo de datas),
+-- paginação por keyset em (data, idTransaction) e filtro por categoria dentro do mês
+CREATE INDEX IF NOT EXISTS idx_transactions_user_data ON transactions (idUser, data, idTransaction);
+CREATE INDEX IF NOT EXISTS idx_transactions_user_categoria_data ON transactions (idUser, categoria, data);
+
+-- Resumo mensal por usuário e categoria, mantido pelo backend a cada inserção
+-- em transactions. Reconstruir com: python -m scripts.reconstruir_resumo
+CREATE TABLE IF NOT EXISTS transactions_resumo_mensal (
+  idUser INT NOT NULL,
+  mes DATE NOT NULL,  -- Primeiro dia do mês
+  categoria VARCHAR(255) NOT NULL,
+  total DECIMAL(14, 2) NOT NULL DEFAULT 0,
+  quantidade INT NOT NULL DEFAULT 0,
+  PRIMARY KEY (idUser, mes, categoria),
+  CONSTRAINT fk_resumo_user FOREIGN KEY (idUser) REFERENCES users (idUser) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
 -- Criação da tabela 'cartao'
 CREATE TABLE IF NOT EXISTS cartao (
   idCartao SERIAL PRIMARY KEY,  -- Auto incremento
@@ -64,4 +89,14 @@ CREATE TABLE IF NOT EXISTS ajuda_content (
   header_text JSONB NOT NULL,
   modal_cards JSONB NOT NULL,
   CONSTRAINT fk_ajuda_content_posso_te_ajudar FOREIGN KEY (idPossoTeAjudar) REFERENCES posso_te_ajudar (idPossoTeAjudar) ON DELETE CASCADE ON UPDATE CASCADE
+);
+
+-- Recomendações de conteúdo por usuário, calculadas pelo backend quando o
+-- questionário em 'respostas' é criado ou alterado
+CREATE TABLE IF NOT EXISTS posso_ajudar_recomendado (
+  idUser INT NOT NULL,
+  idPossoTeAjudar INT NOT NULL,
+  PRIMARY KEY (idUser, idPossoTeAjudar),
+  CONSTRAINT fk_recomendado_user FOREIGN KEY (idUser) REFERENCES users (idUser) ON DELETE CASCADE ON UPDATE CASCADE,
+  CONSTRAINT fk_recomendado_posso_te_ajudar FOREIGN KEY (idPossoTeAjudar) REFERENCES posso_te_ajudar (idPossoTeAjudar) ON DELETE CASCADE ON UPDATE CASCADE
 );
\ No newline at end of file
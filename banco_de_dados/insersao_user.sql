@@ -3,6 +3,10 @@ VALUES
   ('Jonas', 'Cesar', 'jonasbo66@gmail.com', crypt('jonas123', gen_salt('bf'))),
   ('Kaua', 'Henrique', 'kaua.sbc@gmail.com', crypt('kaua123', gen_salt('bf')));
 
+INSERT INTO usuarios_diretorio (idUser, email)
+SELECT idUser, email FROM users;
+SELECT setval(pg_get_serial_sequence('usuarios_diretorio', 'iduser'), (SELECT MAX(idUser) FROM usuarios_diretorio));
+
 INSERT INTO transactions (idUser, estabelecimento, categoria, valor, data)
 VALUES 
   (1, 'Mercado', 'Alimentação', 100.00, '2025-01-01'),
@@ -18,6 +22,11 @@ VALUES
   (1, 'Posto de gasolina', 'Transporte', 400.00, '2025-04-03'),
   (1, 'Posto de gasolina', 'Transporte', 400.00, '2025-02-28'),
   (1, 'Posto de gasolina', 'Transporte', 400.00, '2025-03-1');
+
+INSERT INTO transactions_resumo_mensal (idUser, mes, categoria, total, quantidade)
+SELECT idUser, date_trunc('month', data)::date, categoria, SUM(valor), COUNT(*)
+FROM transactions
+GROUP BY 1, 2, 3;
   
   INSERT INTO cartao (idUser, numero, nome, meta, tipo)
   VALUES
@@ -80,6 +89,7 @@ VALUES
   (10, '[{"title": "Como empreender com sucesso?", "description": "Dicas financeiras essenciais para pequenos negócios e MEIs."}]',
        '[{"title": "Gestão financeira para negócios", "description": "Como organizar as finanças da sua empresa."}, {"title": "Separar finanças pessoais e empresariais", "description": "Evite misturar dinheiro do negócio com gastos pessoais."}]');
 
+-- Recomendações iniciais dos usuários com questionário respondido
 WITH perfil AS (
   SELECT
     idUser,
@@ -104,9 +114,11 @@ WITH perfil AS (
       ELSE NULL
     END AS renda
   FROM respostas
-  WHERE idUser = 6
 )
-SELECT DISTINCT ac.idpossoteajudar
+INSERT INTO posso_ajudar_recomendado (idUser, idPossoTeAjudar)
+SELECT DISTINCT p.idUser, pa.idPossoTeAjudar
 FROM perfil p
 JOIN posso_te_ajudar pa ON pa.idpossoteajudar IN (p.objetivo, p.perfil, p.renda)
-JOIN ajuda_content ac ON ac.idPossoTeAjudar = pa.idpossoteajudar;
\ No newline at end of file
+WHERE EXISTS (
+  SELECT 1 FROM ajuda_content ac WHERE ac.idPossoTeAjudar = pa.idPossoTeAjudar
+);
\ No newline at end of file
@@ -368,6 +368,7 @@ server.post('/update_cartao', express.urlencoded({ extended: true }), async (req
             },
             body: JSON.stringify({ 
               idCartao: idCartao, 
+              idUser: idUser,
               meta: data.meta, 
             })
           }
@@ -387,15 +388,24 @@ server.post('/update_cartao', express.urlencoded({ extended: true }), async (req
 server.get('/metas', async (req,res) => {
   let idUser = req.cookies.idUser
   try {
+    // progresso=true já traz o gasto do último mês e a porcentagem da meta de cada cartão
     const response_card = await fetch(
-      `http://${host_backend}:${port_backend}/cards/id=${idUser}`
+      `http://${host_backend}:${port_backend}/cards/id=${idUser}?progresso=true`
     );
     if (!response_card.ok) throw new Error('Erro ao buscar cartões');
     const cartao_data = await response_card.json();
 
     const ultimo_cartao = cartao_data.length - 1;
-    
+
+    const response_transacao = await fetch(
+      `http://${host_backend}:${port_backend}/transacao_categoria/id=${idUser}`
+    );
+    if (!response_transacao.ok) throw new Error('Erro ao buscar transações');
+    const dados = await response_transacao.json();
+
     var meta = 0;
+    var gasto = 0;
+    var porcentagem = 0;
     if(ultimo_cartao < 0){
       const response_form = await fetch(
         `http://${host_backend}:${port_backend}/respostas/id=${idUser}`
@@ -404,19 +414,15 @@ server.get('/metas', async (req,res) => {
       const form_data = await response_form.json();
       const resposta = form_data[0].resposta.length - 1;
       meta = form_data[0].resposta[resposta].resposta;
+      gasto = Object.values(dados).reduce((acc, categoria) => acc + categoria.total_gasto, 0);
+      porcentagem = (gasto / meta) * 100;
     }else{
-      meta = cartao_data[ultimo_cartao].meta;
+      const cartao = cartao_data[ultimo_cartao];
+      meta = cartao.meta;
+      gasto = cartao.gasto_mes;
+      porcentagem = cartao.porcentagem !== null ? cartao.porcentagem : (gasto / meta) * 100;
     }
 
-    const response_transacao = await fetch(
-      `http://${host_backend}:${port_backend}/transacao_categoria/id=${idUser}`
-    );
-    if (!response_transacao.ok) throw new Error('Erro ao buscar transações');
-    const dados = await response_transacao.json();
-
-    const gasto = Object.values(dados).reduce((acc, categoria) => acc + categoria.total_gasto, 0);
-    const porcentagem = (gasto / meta) * 100;
-
     return res.render('./navigation/metas.htm', {
       categorias: dados,
       limite: meta,
@@ -437,20 +443,14 @@ server.get('/financas', async (req,res) => {
   );
   dados = await response_transacao.json()
 
-  const response_pendente = await fetch(
-    `http://${host_backend}:${port_backend}/transacao_next_transactions/id=${idUser}`
-  );
-  gasto_pendente = await response_pendente.json()
-
-  const response_categorias = await fetch(
-    `http://${host_backend}:${port_backend}/get_categorias/id=${idUser}`
+  const response_dashboard = await fetch(
+    `http://${host_backend}:${port_backend}/dashboard/id=${idUser}`
   );
-  categorias = await response_categorias.json()
+  dashboard = await response_dashboard.json()
 
-  const response_meses = await fetch(
-    `http://${host_backend}:${port_backend}/transacao_mes/id=${idUser}`
-  );
-  meses = await response_meses.json()
+  gasto_pendente = dashboard.transacao_next_transactions
+  categorias = dashboard.get_categorias
+  meses = dashboard.transacao_mes
 
   return res.render('./navigation/financas.htm', {
     idUser: idUser,